@@ -2,6 +2,7 @@
 from pymongo import MongoClient, TEXT
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 
 import torch
 import gc
@@ -81,6 +82,14 @@ async def ensure_indexes():
         print(f"⚠️ Error creating indexes: {e}")
         # Don't raise, as the app can still function without some indexes
 
+    try:
+        # Atlas vector search (with the ACL filter field), conversation and
+        # prompt cache indexes; blocking admin calls run off the event loop
+        from app.core.storage import setup_mongo_indexes
+        await asyncio.get_running_loop().run_in_executor(None, setup_mongo_indexes)
+    except Exception as e:
+        print(f"⚠️ Error creating search indexes: {e}")
+
 
 # sheepmate db
 def get_sync_db_sheepmate():
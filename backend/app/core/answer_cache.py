@@ -0,0 +1,115 @@
+# ============================================
+# answer_cache.py
+# Semantic answer cache: near-identical questions asked against the same
+# teacher scope, with the same retrieved chunks, reuse the stored answer
+# instead of calling the LLM again.
+# ============================================
+
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+# ====================================================
+# Settings
+# ====================================================
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))             # answers kept
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))        # seconds
+# Cosine similarity between query embeddings needed to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+def _context_key(context: Iterable) -> str:
+    """Order-independent fingerprint of the prompt context (retrieved chunks, domain)."""
+    joined = ",".join(sorted(str(c) for c in context))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of answers. Entries are grouped by (scope, context
+    key); within a group the closest cached query embedding wins if it is
+    above ANSWER_CACHE_THRESHOLD. A scope is the tuple of user ids whose
+    notes the answer was built from.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: int = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # entry id -> (group, created, unit embedding, answer)
+        self._groups = {}              # (scope, context key) -> [entry ids]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        return vec / max(float(np.linalg.norm(vec)), 1e-12)
+
+    def _drop(self, entry_id: int):
+        group = self._entries.pop(entry_id)[0]
+        ids = self._groups.get(group)
+        if ids is not None:
+            ids.remove(entry_id)
+            if not ids:
+                del self._groups[group]
+
+    def get(self, scope: tuple, context: Iterable, query_emb) -> Optional[str]:
+        """Cached answer for a near-identical query in the same context, else None."""
+        group = (scope, _context_key(context))
+        q = self._unit(query_emb)
+        now = time.monotonic()
+        with self._lock:
+            for entry_id in [e for e in self._groups.get(group, []) if now - self._entries[e][1] > self.ttl]:
+                self._drop(entry_id)
+            ids = self._groups.get(group)
+            if ids:
+                sims = np.stack([self._entries[e][2] for e in ids]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self._entries.move_to_end(ids[best])
+                    self.hits += 1
+                    return self._entries[ids[best]][3]
+            self.misses += 1
+            return None
+
+    def put(self, scope: tuple, context: Iterable, query_emb, answer: str):
+        if not answer:
+            return
+        group = (scope, _context_key(context))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (group, time.monotonic(), self._unit(query_emb), answer)
+            self._groups.setdefault(group, []).append(entry_id)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *user_ids: Optional[str]):
+        """Drop every answer whose scope includes any of these users (their documents changed)."""
+        user_ids = {str(u) for u in user_ids if u}
+        with self._lock:
+            for entry_id in [e for e, entry in self._entries.items() if user_ids.intersection(entry[0][0])]:
+                self._drop(entry_id)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,70 @@
+# ============================================
+# bm25.py
+# In-process BM25 inverted index over chunk text
+# (rows line up with KnowledgeBaseCache rows)
+# ============================================
+
+import re
+import math
+from array import array
+from collections import Counter
+import numpy as np
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+# Very common question words only; BM25's idf handles the rest
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "of", "in", "on", "to", "for",
+    "and", "or", "what", "which", "how", "why", "does", "do", "it", "this", "that",
+}
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Append-only inverted index: term -> (rows, term frequencies)."""
+
+    def __init__(self):
+        self.postings = {}
+        self.doc_len = array("I")
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, row: int, text: str):
+        """Index the text of the next row (rows must be added in order)."""
+        if row != len(self.doc_len):
+            raise ValueError(f"BM25 rows must be appended in order (expected {len(self.doc_len)}, got {row})")
+        tokens = tokenize(text)
+        for term, tf in Counter(tokens).items():
+            rows, tfs = self.postings.setdefault(term, (array("q"), array("I")))
+            rows.append(row)
+            tfs.append(tf)
+        self.doc_len.append(len(tokens))
+        self.total_len += len(tokens)
+
+    def scores(self, query_text: str) -> np.ndarray:
+        """BM25 score of the query for every row (0 where no term matches)."""
+        n = len(self.doc_len)
+        out = np.zeros(n, dtype=np.float32)
+        if not n:
+            return out
+        avgdl = self.total_len / n or 1.0
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32).astype(np.float32)
+
+        for term in set(tokenize(query_text)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows = np.frombuffer(posting[0], dtype=np.int64).copy()
+            tf = np.frombuffer(posting[1], dtype=np.uint32).astype(np.float32)
+            df = len(rows)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[rows] / avgdl)
+            out[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return out
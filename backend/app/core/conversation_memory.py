@@ -1,10 +1,169 @@
+import os
+import time
+import asyncio
+import threading
 import numpy as np
+from collections import OrderedDict
 from datetime import datetime
+from pymongo import UpdateOne
 from app.config.db import get_collection
-from app.core.retriever_cache import embedder
+from app.core.retriever_cache import embedding_cache, EMBEDDING_DIM
+from app.core.embedding_codec import encode_embedding, decode_embedding
 from bson import ObjectId
 from typing import Optional
 
+# ====================================================
+# Per-user memory index settings
+# ====================================================
+
+MEMORY_WINDOW = 200  # most recent conversations considered per user/domain
+MEMORY_INDEX_USERS = int(os.getenv("MEMORY_INDEX_USERS", "1024"))  # active users kept in RAM
+# Re-read a user's index after this long, picking up conversations saved by other workers
+MEMORY_INDEX_TTL = int(os.getenv("MEMORY_INDEX_TTL", "300"))  # seconds
+
+# Fire-and-forget tasks are referenced until done so they cannot be garbage-collected mid-write
+_background_tasks = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _unit_rows(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1e-10
+    return (embeddings / norms).astype(np.float32)
+
+
+async def _write_back_embeddings(conv_col, ids: list, embeddings: np.ndarray):
+    """Persist embeddings computed for conversations that were missing one."""
+    try:
+        await conv_col.bulk_write(
+            [UpdateOne({"_id": _id}, {"$set": {"embedding": encode_embedding(emb)}}) for _id, emb in zip(ids, embeddings)],
+            ordered=False,
+        )
+        print(f"🧠 Backfilled {len(ids)} conversation embeddings")
+    except Exception as e:
+        print(f"⚠️ Failed to backfill conversation embeddings: {e}")
+
+
+class ConversationMemoryIndex:
+    """
+    LRU of per-user memory indexes: a unit-normalised embedding matrix plus
+    conversation ids (newest first) for each active (user_id, domain).
+    Loaded from MongoDB, appended to by _save_conversation and re-read
+    after MEMORY_INDEX_TTL. Appends that land while a load is in flight
+    are re-applied to the loaded index.
+    """
+
+    def __init__(self, max_users: int = MEMORY_INDEX_USERS, ttl: int = MEMORY_INDEX_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users = OrderedDict()  # (user_id, domain) -> (loaded_at, ids, embeddings)
+        self._loading = {}           # (user_id, domain) -> [loads in flight, appends seen meanwhile]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _filter(user_id: str, domain: Optional[str]) -> dict:
+        return {"user_id": user_id, "answer": {"$ne": ""}, "domain": domain if domain else {"$exists": False}}
+
+    @staticmethod
+    def _prepend(ids: list, embeddings: np.ndarray, conversation_id, row: np.ndarray) -> tuple:
+        if conversation_id in ids:
+            return ids, embeddings
+        return ([conversation_id] + ids)[:MEMORY_WINDOW], np.vstack([row, embeddings])[:MEMORY_WINDOW]
+
+    def _store(self, key: tuple, loaded_at: float, ids: list, embeddings: np.ndarray):
+        """Insert an entry; the caller holds self._lock."""
+        self._users[key] = (loaded_at, ids, embeddings)
+        self._users.move_to_end(key)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    async def _load(self, conv_col, user_id: str, domain: Optional[str]) -> tuple:
+        """Read only ids and embeddings; bodies are fetched just for missing embeddings."""
+        convs = await conv_col.find(
+            self._filter(user_id, domain), {"_id": 1, "embedding": 1}
+        ).sort("created_at", -1).to_list(length=MEMORY_WINDOW)
+
+        ids = [c["_id"] for c in convs]
+        embeddings = np.empty((len(convs), EMBEDDING_DIM), dtype=np.float32)
+        missing = []
+        for i, c in enumerate(convs):
+            emb = c.get("embedding")
+            emb = decode_embedding(emb) if emb is not None else None
+            if emb is not None and len(emb) == EMBEDDING_DIM:
+                embeddings[i] = emb
+            else:
+                missing.append(i)
+
+        if missing:
+            bodies = {
+                c["_id"]: c
+                for c in await conv_col.find(
+                    {"_id": {"$in": [ids[i] for i in missing]}}, {"query": 1, "answer": 1}
+                ).to_list(length=None)
+            }
+            # Same text as _save_conversation embeds, so backfilled vectors match new ones
+            texts = [
+                f"{bodies.get(ids[i], {}).get('query', '')} {bodies.get(ids[i], {}).get('answer', '')}"
+                for i in missing
+            ]
+            encoded = await embedding_cache.aencode_many(texts)
+            embeddings[missing] = encoded
+            _spawn(_write_back_embeddings(conv_col, [ids[i] for i in missing], encoded))
+
+        return ids, _unit_rows(embeddings)
+
+    async def get(self, conv_col, user_id: str, domain: Optional[str]) -> tuple:
+        key = (user_id, domain)
+        with self._lock:
+            entry = self._users.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._users.move_to_end(key)
+                return entry[1], entry[2]
+            loading = self._loading.setdefault(key, [0, []])
+            loading[0] += 1
+
+        loaded_at = time.monotonic()
+        try:
+            ids, embeddings = await self._load(conv_col, user_id, domain)
+        finally:
+            with self._lock:
+                loading[0] -= 1
+                if loading[0] == 0 and self._loading.get(key) is loading:
+                    del self._loading[key]
+
+        with self._lock:
+            # Conversations saved while the load was in flight may be missing from it
+            for conversation_id, row in loading[1]:
+                ids, embeddings = self._prepend(ids, embeddings, conversation_id, row)
+            self._store(key, loaded_at, ids, embeddings)
+        return ids, embeddings
+
+    def append(self, user_id: str, domain: Optional[str], conversation_id, embedding):
+        """Add a just-saved conversation to the user's index if it is loaded or loading."""
+        key = (user_id, domain)
+        row = _unit_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+        with self._lock:
+            loading = self._loading.get(key)
+            if loading is not None:
+                loading[1].append((conversation_id, row))
+            entry = self._users.get(key)
+            if entry is not None:
+                self._users[key] = (entry[0], *self._prepend(entry[1], entry[2], conversation_id, row))
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            for key in [k for k in self._users if k[0] == user_id]:
+                del self._users[key]
+
+
+conversation_memory_index = ConversationMemoryIndex()
+
 
 async def retrieve_from_conversation_memory(
     user_id: str,
@@ -14,30 +173,38 @@ async def retrieve_from_conversation_memory(
 ):
     """
     Retrieve top-K relevant past conversations for a user.
-    Tries pre-stored embeddings (fast). Falls back to compute if missing.
+    Scores the user's in-memory conversation index with a single matmul and
+    fetches only the top-K conversation bodies from MongoDB.
     """
     conv_col = get_collection("conversations")
 
-    # Fetch recent user conversations
-    recent_convs = await conv_col.find({"user_id": user_id, "answer": {"$ne": ""}, "domain": domain if domain else {"$exists": False}}).sort("created_at", -1).to_list(length=200)
-    if not recent_convs:
+    ids, corpus_embs = await conversation_memory_index.get(conv_col, user_id, domain)
+    if not ids:
         return []
 
-    query_emb = embedder.encode(query_text).astype(np.float32)
+    query_emb = await embedding_cache.aencode(query_text)
+    query_norm = np.linalg.norm(query_emb) or 1e-10
+
+    # Cosine similarity for every conversation in one matmul
+    scores = (corpus_embs @ query_emb) / query_norm
+
+    k = min(top_k, len(ids))
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(ids) else np.arange(len(ids))
+    top = top[np.argsort(-scores[top])]
 
-    corpus_texts, corpus_embs = [], []
-    for c in recent_convs:
-        emb = c.get("embedding")
-        if emb:
-            corpus_embs.append(np.array(emb, dtype=np.float32))
-        else:
-            text = f"Q: {c.get('query', '')}\nA: {c.get('answer', '')}"
-            corpus_embs.append(embedder.encode(text).astype(np.float32))
-        corpus_texts.append(f"Q: {c.get('query', '')}\nA: {c.get('answer', '')}\nComments: {c.get('comments', [])}")
+    top_ids = [ids[i] for i in top]
+    bodies = {
+        c["_id"]: c
+        for c in await conv_col.find({"_id": {"$in": top_ids}}).to_list(length=len(top_ids))
+    }
 
-    # Compute cosine similarity
-    scores = [float(np.dot(query_emb, emb) / (np.linalg.norm(query_emb) * np.linalg.norm(emb))) for emb in corpus_embs]
-    ranked = sorted(zip(scores, recent_convs, corpus_texts), key=lambda x: x[0], reverse=True)
+    ranked = []
+    for i in top:
+        c = bodies.get(ids[i])
+        if c is None:
+            continue
+        corpus_text = f"Q: {c.get('query', '')}\nA: {c.get('answer', '')}\nComments: {c.get('comments', [])}"
+        ranked.append((float(scores[i]), c, corpus_text))
 
     top_results = [
         {
@@ -49,7 +216,7 @@ async def retrieve_from_conversation_memory(
             "document_type": "conversation" ,
             "created_at": conv.get("created_at")
         }
-        for score, conv, corpus_text in ranked[:top_k]
+        for score, conv, corpus_text in ranked
     ]
     try:
         chats_col = get_collection("chats")
@@ -0,0 +1,50 @@
+# ============================================
+# embedding_codec.py
+# How embeddings are stored in MongoDB: BSON binary vectors
+# (BinData subtype 9, packed little-endian float32 or int8) instead of
+# arrays of doubles. Reads accept both the binary and the legacy array
+# format, so collections can be migrated in place.
+# ============================================
+
+import os
+import numpy as np
+from bson.binary import Binary
+from app.core.quantization import quantize_int8, dequantize_int8
+
+# float32 (default) | int8 (unit vectors only, 4× smaller again) | list (legacy arrays)
+EMBEDDING_STORAGE_FORMAT = os.getenv("EMBEDDING_STORAGE_FORMAT", "float32").lower()
+
+# BSON binary vector: subtype 9, then a dtype byte and a padding byte
+VECTOR_SUBTYPE = 9
+DTYPE_FLOAT32 = 0x27
+DTYPE_INT8 = 0x03
+
+
+def encode_embedding(embedding, storage_format: str = EMBEDDING_STORAGE_FORMAT):
+    """Encode one embedding for storage in MongoDB."""
+    vec = np.asarray(embedding, dtype=np.float32).ravel()
+    if storage_format == "list":
+        return vec.tolist()
+    if storage_format == "int8":
+        return Binary(bytes([DTYPE_INT8, 0]) + quantize_int8(vec).tobytes(), VECTOR_SUBTYPE)
+    return Binary(bytes([DTYPE_FLOAT32, 0]) + vec.astype("<f4").tobytes(), VECTOR_SUBTYPE)
+
+
+def decode_embedding(value) -> np.ndarray:
+    """
+    Decode a stored embedding (binary vector or legacy array) to float32.
+    Binary float32 vectors are returned as a read-only view of the BSON
+    bytes (no per-element Python floats); callers copy if they keep it.
+    """
+    if isinstance(value, bytes):  # Binary subclasses bytes
+        buf = memoryview(value)
+        if getattr(value, "subtype", None) == VECTOR_SUBTYPE:
+            dtype, buf = buf[0], buf[2:]
+        else:
+            dtype = DTYPE_FLOAT32  # raw packed float32
+        if dtype == DTYPE_FLOAT32:
+            return np.frombuffer(buf, dtype="<f4")
+        if dtype == DTYPE_INT8:
+            return dequantize_int8(np.frombuffer(buf, dtype=np.int8))
+        raise ValueError(f"Unsupported embedding vector dtype 0x{dtype:02x}")
+    return np.asarray(value, dtype=np.float32)
@@ -1,6 +1,32 @@
 
-from app.core.retriever_cache import embedder
+import numpy as np
+from app.core.retriever_cache import embedding_cache, embedding_service
 
 
 def generate_embeddings(text: str):
-  return embedder.encode(text).tolist()
\ No newline at end of file
+  return embedding_cache.encode(text).tolist()
+
+
+async def agenerate_embeddings_batch(texts: list) -> np.ndarray:
+  """
+  Embed ingestion chunks on the embedding service's worker pool, in
+  EMBEDDING_MAX_BATCH slices, so ingestion never blocks the event loop.
+  Returns an (n, dim) float32 matrix. Chunks bypass the query embedding
+  cache so a large upload does not evict hot queries.
+  """
+  return await embedding_service.embed_many(texts)
+
+
+def centroid_embedding(embeddings) -> list:
+  """
+  Unit-normalised mean of a document's chunk embeddings, stored on the
+  document so retrieval can shortlist documents before searching chunks.
+  Returns [] for an empty matrix.
+  """
+  mat = np.asarray(embeddings, dtype=np.float32)
+  if mat.size == 0:
+    return []
+  mat = mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+  centroid = mat.mean(axis=0)
+  norm = np.linalg.norm(centroid)
+  return (centroid / norm if norm > 0 else centroid).tolist()
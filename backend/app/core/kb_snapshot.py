@@ -0,0 +1,149 @@
+# ============================================
+# kb_snapshot.py
+# On-disk snapshots of a KnowledgeBaseCache under DATA_DIR/kb_snapshots.
+# The faiss index (which holds the float vectors of unquantised KBs) is
+# memory-mapped on load, as is the separate embedding matrix of quantised
+# KBs, so several workers share their pages through the OS cache.
+# ============================================
+
+import os
+import json
+import time
+import shutil
+import pickle
+import numpy as np
+import faiss
+from pathlib import Path
+from app.config.settings import DATA_DIR
+
+SNAPSHOT_DIR = Path(os.getenv("KB_SNAPSHOT_DIR", str(DATA_DIR / "kb_snapshots")))
+SNAPSHOT_VERSION = 2
+
+# ====================================================
+# Layout: <SNAPSHOT_DIR>/<kb>/<generation>/{meta.json, index.faiss, ...}
+# <SNAPSHOT_DIR>/<kb>/CURRENT names the live generation and is swapped
+# atomically, so readers never see a half-written snapshot.
+# ====================================================
+
+
+def _kb_dir(name: str) -> Path:
+    return SNAPSHOT_DIR / name
+
+
+def _generation_key(gen: str):
+    """Sort key of a generation name (<millis>-<pid>), None for anything else."""
+    try:
+        millis, pid = gen.split("-")
+        return int(millis), int(pid)
+    except ValueError:
+        return None
+
+
+def _read_current(kb_dir: Path):
+    try:
+        return (kb_dir / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def current_generation(name: str):
+    """
+    Directory of the live snapshot for a KB, or None. If the generation
+    CURRENT names is gone, falls back to the newest complete one.
+    """
+    kb_dir = _kb_dir(name)
+    gen = _read_current(kb_dir)
+    if gen is None:
+        return None
+    path = kb_dir / gen
+    if (path / "meta.json").exists():
+        return path
+    complete = [
+        entry for entry in kb_dir.iterdir()
+        if _generation_key(entry.name) is not None and (entry / "meta.json").exists()
+    ]
+    return max(complete, key=lambda entry: _generation_key(entry.name), default=None)
+
+
+def write_snapshot(name: str, meta: dict, columns: dict, capacity: int,
+                   texts: bytes, index_bytes: np.ndarray, bm25_bytes: bytes) -> Path:
+    """
+    Write a new snapshot generation and make it current.
+    `columns` holds the live prefix of each column (ids, created_at,
+    text_offsets, alive and, for quantised KBs only, embeddings); the
+    embedding matrix is written with `capacity` rows so appends after a
+    restart fit without copying it.
+    """
+    kb_dir = _kb_dir(name)
+    gen = f"{int(time.time() * 1000)}-{os.getpid()}"
+    tmp = kb_dir / f"{gen}.tmp"
+    tmp.mkdir(parents=True, exist_ok=True)
+
+    embeddings = columns.get("embeddings")
+    if embeddings is not None:
+        mat = np.lib.format.open_memmap(
+            tmp / "embeddings.npy", mode="w+", dtype=np.float32,
+            shape=(max(capacity, len(embeddings)), embeddings.shape[1]),
+        )
+        mat[:len(embeddings)] = embeddings
+        mat.flush()
+        del mat
+
+    for key in ("ids", "created_at", "text_offsets", "alive"):
+        np.save(tmp / f"{key}.npy", columns[key])
+    (tmp / "texts.bin").write_bytes(texts)
+    index_bytes.tofile(tmp / "index.faiss")
+    (tmp / "bm25.pkl").write_bytes(bm25_bytes)
+    (tmp / "meta.json").write_text(json.dumps({**meta, "version": SNAPSHOT_VERSION}))
+
+    final = kb_dir / gen
+    os.replace(tmp, final)
+    live = _read_current(kb_dir)
+    if live is None or _generation_key(live) is None or _generation_key(live) < _generation_key(gen):
+        current_tmp = kb_dir / f"CURRENT.{gen}.tmp"
+        current_tmp.write_text(gen)
+        os.replace(current_tmp, kb_dir / "CURRENT")
+
+    # Generations older than the live one can go; workers that mapped them
+    # keep their pages. Re-read CURRENT: another worker may have swapped in
+    # its own, and newer generations may be renamed in but not current yet.
+    live = _generation_key(_read_current(kb_dir) or "")
+    if live is not None:
+        for entry in kb_dir.iterdir():
+            key = _generation_key(entry.name)
+            if key is not None and key < live and entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+    return final
+
+
+def read_snapshot(name: str, binary: bool = False):
+    """
+    Open the live snapshot of a KB: returns (meta, columns, texts, index, bm25)
+    or None when there is none. The index is memory-mapped read-only (the
+    cache copies it before its first write); the embedding matrix, if any,
+    is memory-mapped copy-on-write.
+    """
+    path = current_generation(name)
+    if path is None:
+        return None
+
+    try:
+        meta = json.loads((path / "meta.json").read_text())
+        if meta.get("version") != SNAPSHOT_VERSION:
+            return None
+
+        columns = {}
+        if (path / "embeddings.npy").exists():
+            columns["embeddings"] = np.load(path / "embeddings.npy", mmap_mode="c")
+        for key in ("ids", "created_at", "text_offsets", "alive"):
+            columns[key] = np.load(path / f"{key}.npy")
+        texts = (path / "texts.bin").read_bytes()
+        read_index = faiss.read_index_binary if binary else faiss.read_index
+        index = read_index(str(path / "index.faiss"), faiss.IO_FLAG_MMAP_IFC)
+        with open(path / "bm25.pkl", "rb") as f:
+            bm25 = pickle.load(f)
+    except (FileNotFoundError, RuntimeError):
+        # Another worker removed this generation while we were reading it
+        print(f"⚠️ Snapshot {path.name} of {name} KB disappeared while loading.")
+        return None
+    return meta, columns, texts, index, bm25
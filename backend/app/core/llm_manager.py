@@ -4,14 +4,16 @@
 # (Auto-selects OpenAI → Hugging Face → Ollama → Fallback)
 # ============================================
 
-from app.llms.ollama import call_ollama
-from app.llms.huggingface import call_huggingface
-from app.llms.gemini import call_gemini
-from app.llms.openai import call_openai
+from app.llms.ollama import call_ollama, acall_ollama, OLLAMA_MODEL
+from app.llms.huggingface import call_huggingface, acall_huggingface, astream_huggingface, HF_MODEL
+from app.llms.gemini import call_gemini, acall_gemini, astream_gemini, GEMINI_MODEL
+from app.llms.openai import call_openai, acall_openai, astream_openai, OPENAI_MODEL
+from app.core.llm_router import llm_router
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
 from dotenv import load_dotenv
 import logging
+import asyncio
 import os
 
 # ------------------------------------------------
@@ -20,7 +22,7 @@ import os
 load_dotenv()
 logger = logging.getLogger("llm-manager")
 
-LLM_MODE = os.getenv("LLM_MODE", "openai").lower()  # auto | huggingface | ollama | openai | gemini
+LLM_MODE = os.getenv("LLM_MODE", "openai").lower()  # auto | huggingface | ollama | openai | gemini | router
 FALLBACK_MODEL = "distilgpt2"
 # ------------------------------------------------
 # Device detection
@@ -36,6 +38,22 @@ def detect_device():
 DEVICE = detect_device()
 logger.info(f"🧠 Using device: {DEVICE.upper()}")
 
+# ------------------------------------------------
+# Model identity (for caches keyed by model)
+# ------------------------------------------------
+def llm_model_id(LLM_MODE: str = LLM_MODE) -> str:
+    """Provider and model call_llm / acall_llm would use for this mode."""
+    if LLM_MODE == "router":
+        return f"router:{llm_router.model_id()}"
+    models = {
+        "auto": OPENAI_MODEL,
+        "openai": OPENAI_MODEL,
+        "gemini": GEMINI_MODEL,
+        "huggingface": HF_MODEL,
+        "ollama": OLLAMA_MODEL,
+    }
+    return f"{LLM_MODE}:{models.get(LLM_MODE, FALLBACK_MODEL)}"
+
 # ------------------------------------------------
 # Core LLM handler
 # ------------------------------------------------
@@ -48,6 +66,10 @@ def call_llm(prompt: str, LLM_MODE: str = LLM_MODE) -> str:
     4️⃣ Offline Fallback
     """
 
+    # Sync callers cannot race providers: use the current fastest healthy one
+    if LLM_MODE == "router" and llm_router.providers:
+        LLM_MODE = llm_router.ranked("call")[0]
+
     # =======================
     # 1️⃣ OpenAI
     # =======================
@@ -72,6 +94,10 @@ def call_llm(prompt: str, LLM_MODE: str = LLM_MODE) -> str:
     if LLM_MODE in ["ollama"]:
         return call_ollama(prompt)
 
+    return _offline_fallback(prompt)
+
+
+def _offline_fallback(prompt: str) -> str:
     # =======================
     # 4️⃣ Offline fallback
     # =======================
@@ -87,4 +113,53 @@ def call_llm(prompt: str, LLM_MODE: str = LLM_MODE) -> str:
         return "I'm currently unable to answer due to system issues."
 
 
+# ------------------------------------------------
+# Async LLM handler
+# ------------------------------------------------
+async def acall_llm(prompt: str, LLM_MODE: str = LLM_MODE) -> str:
+    """
+    Async call_llm: same routing, but awaits the providers' async clients
+    (pooled HTTP) so a slow generation never blocks the event loop.
+    LLM_MODE=router picks the fastest healthy provider (see llm_router.py).
+    """
+    if LLM_MODE == "router":
+        return await llm_router.acall(prompt)
+
+    if LLM_MODE in ["auto", "openai"]:
+        return await acall_openai(prompt)
+
+    if LLM_MODE in ["gemini"]:
+        return await acall_gemini(prompt)
+
+    if LLM_MODE in ["huggingface"]:
+        return await acall_huggingface(prompt)
+
+    if LLM_MODE in ["ollama"]:
+        return await acall_ollama(prompt)
+
+    # Local model generation is CPU/GPU bound: keep it off the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _offline_fallback, prompt)
+
+
+async def astream_llm(prompt: str, LLM_MODE: str = LLM_MODE):
+    """
+    Yield the answer in pieces as the provider generates it. Providers
+    without a streaming API (Ollama, offline fallback) yield one piece.
+    """
+    if LLM_MODE == "router":
+        stream = llm_router.astream(prompt)
+    elif LLM_MODE in ["auto", "openai"]:
+        stream = astream_openai(prompt)
+    elif LLM_MODE in ["gemini"]:
+        stream = astream_gemini(prompt)
+    elif LLM_MODE in ["huggingface"]:
+        stream = astream_huggingface(prompt)
+    else:
+        answer = await acall_llm(prompt, LLM_MODE)
+        if answer:
+            yield answer
+        return
 
+    async for token in stream:
+        yield token
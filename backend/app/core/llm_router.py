@@ -0,0 +1,283 @@
+# ============================================
+# llm_router.py
+# Latency-aware routing across LLM providers (LLM_MODE=router).
+# Tracks p50/p95 latency and error rate per provider/model, sends each
+# request to the fastest healthy one and, optionally, hedges: a second
+# provider is started when the first has not answered (or produced a
+# first token) within the hedge delay; the loser is cancelled.
+# ============================================
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+from dotenv import load_dotenv
+
+from app.llms.ollama import acall_ollama, OLLAMA_MODEL
+from app.llms.huggingface import acall_huggingface, astream_huggingface, HF_MODEL
+from app.llms.gemini import acall_gemini, astream_gemini, GEMINI_MODEL
+from app.llms.openai import acall_openai, astream_openai, OPENAI_MODEL
+
+# ------------------------------------------------
+# Load configuration
+# ------------------------------------------------
+load_dotenv()
+logger = logging.getLogger("llm-router")
+
+# Candidate providers, in order of preference while no latency is known yet
+LLM_ROUTER_PROVIDERS = [
+    p.strip() for p in os.getenv("LLM_ROUTER_PROVIDERS", "openai,gemini").lower().split(",") if p.strip()
+]
+# Start a hedge if the primary has no first token after this long (0 = off)
+LLM_HEDGE_MS = int(os.getenv("LLM_HEDGE_MS", "0"))
+# Same for non-streaming calls, where the "first token" is the whole answer
+LLM_HEDGE_CALL_MS = int(os.getenv("LLM_HEDGE_CALL_MS", "0"))
+# Attempts allowed to race at once (primary + hedges); failover is not capped
+LLM_HEDGE_MAX_PARALLEL = int(os.getenv("LLM_HEDGE_MAX_PARALLEL", "2"))
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "200"))            # samples per provider
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+LLM_ROUTER_COOLDOWN = float(os.getenv("LLM_ROUTER_COOLDOWN", "30"))      # seconds before re-probing
+# Outcomes needed before the error rate can mark a provider unhealthy
+LLM_ROUTER_MIN_SAMPLES = 5
+
+
+async def _astream_ollama(prompt: str):
+    """Ollama has no streaming client here: the whole answer is one piece."""
+    answer = await acall_ollama(prompt)
+    if answer:
+        yield answer
+
+
+# name -> (model, async call, async token stream)
+PROVIDERS = {
+    "openai": (OPENAI_MODEL, acall_openai, astream_openai),
+    "gemini": (GEMINI_MODEL, acall_gemini, astream_gemini),
+    "huggingface": (HF_MODEL, acall_huggingface, astream_huggingface),
+    "ollama": (OLLAMA_MODEL, acall_ollama, _astream_ollama),
+}
+
+
+def _percentile(samples, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# ====================================================
+# Per-provider health
+# ====================================================
+
+class ProviderStats:
+    """
+    Sliding window of latencies (per request kind: full "call" or
+    first token of a "stream") and success/failure outcomes.
+    """
+
+    def __init__(self, window: int = LLM_ROUTER_WINDOW):
+        self.latencies = {"call": deque(maxlen=window), "stream": deque(maxlen=window)}
+        self.outcomes = deque(maxlen=window)
+        self.failed_at = 0.0
+        self.wins = 0
+        self.cancelled = 0
+
+    def record(self, kind: str, seconds: float, ok: bool):
+        if ok and not self.healthy:
+            # A probe (or last-resort failover) got through: back into rotation
+            self.outcomes.clear()
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies[kind].append(seconds)
+        else:
+            self.failed_at = time.monotonic()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    @property
+    def healthy(self) -> bool:
+        return len(self.outcomes) < LLM_ROUTER_MIN_SAMPLES or self.error_rate < LLM_ROUTER_MAX_ERROR_RATE
+
+    def admit(self) -> bool:
+        """
+        Whether a request may rank this provider as healthy. Once the cooldown
+        has passed, an unhealthy provider admits a single probe: the cooldown
+        restarts at once, so concurrent requests keep skipping it.
+        """
+        if self.healthy:
+            return True
+        if time.monotonic() - self.failed_at > LLM_ROUTER_COOLDOWN:
+            self.failed_at = time.monotonic()
+            return True
+        return False
+
+    def p95(self, kind: str) -> float:
+        """Ranking latency; a provider with no samples yet ranks first so it gets measured."""
+        samples = self.latencies[kind] or self.latencies["stream" if kind == "call" else "call"]
+        return _percentile(samples, 0.95) or 0.0
+
+    def summary(self) -> dict:
+        def ms(kind, q):
+            value = _percentile(self.latencies[kind], q)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "healthy": self.healthy,
+            "samples": len(self.outcomes),
+            "error_rate": round(self.error_rate, 4),
+            "call_p50_ms": ms("call", 0.5),
+            "call_p95_ms": ms("call", 0.95),
+            "first_token_p50_ms": ms("stream", 0.5),
+            "first_token_p95_ms": ms("stream", 0.95),
+            "wins": self.wins,
+            "cancelled": self.cancelled,
+        }
+
+
+# ====================================================
+# Router
+# ====================================================
+
+class LLMRouter:
+    def __init__(self, providers: list = LLM_ROUTER_PROVIDERS):
+        unknown = [p for p in providers if p not in PROVIDERS]
+        if unknown:
+            print(f"⚠️ LLM router ignoring unknown providers: {unknown}")
+        self.providers = [p for p in providers if p in PROVIDERS]
+        self._stats = {p: ProviderStats() for p in self.providers}
+        self.requests = 0
+        self.hedged = 0
+        self.failovers = 0
+        self.exhausted = 0
+
+    def model_id(self) -> str:
+        return ",".join(f"{p}:{PROVIDERS[p][0]}" for p in self.providers)
+
+    def ranked(self, kind: str, probe: bool = True) -> list:
+        """
+        Healthy providers fastest first, then unhealthy ones as a last resort.
+        probe=False (reporting) never hands out a cooldown probe.
+        """
+        healthy = [p for p in self.providers if (self._stats[p].admit() if probe else self._stats[p].healthy)]
+        sick = [p for p in self.providers if p not in healthy]
+        healthy.sort(key=lambda p: self._stats[p].p95(kind))
+        sick.sort(key=lambda p: self._stats[p].failed_at)
+        return healthy + sick
+
+    async def _race(self, kind: str, queue: list, start, hedge_ms: int):
+        """
+        Run attempts from queue until one produces a result. start(name)
+        returns an awaitable whose result is falsy on failure. Returns
+        (name, result, started) of the winner, or None.
+        """
+        if not queue:
+            return None
+        pending = {}  # task -> (name, started)
+
+        def launch():
+            name = queue.pop(0)
+            pending[asyncio.ensure_future(start(name))] = (name, time.perf_counter())
+
+        launch()
+        try:
+            while pending:
+                can_hedge = hedge_ms > 0 and queue and len(pending) < LLM_HEDGE_MAX_PARALLEL
+                done, _ = await asyncio.wait(
+                    pending, timeout=hedge_ms / 1000 if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    self.hedged += 1
+                    print(f"⏱️ No {kind} response after {hedge_ms}ms, hedging with {queue[0]}")
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    name, started = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"⚠️ {name} failed: {e}")
+                        result = None
+                    if result and winner is None:
+                        winner = (name, result, started)
+                    elif not result:
+                        self._stats[name].record(kind, time.perf_counter() - started, ok=False)
+                if winner:
+                    return winner
+                if queue and not pending:
+                    self.failovers += 1
+                    launch()
+            return None
+        finally:
+            # Cancel the losers; their latency says nothing about the provider
+            for task, (name, _) in pending.items():
+                task.cancel()
+                self._stats[name].cancelled += 1
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def acall(self, prompt: str) -> Optional[str]:
+        """Answer from the fastest healthy provider, or None if all fail."""
+        self.requests += 1
+        won = await self._race("call", self.ranked("call"), lambda name: PROVIDERS[name][1](prompt), LLM_HEDGE_CALL_MS)
+        if won is None:
+            self.exhausted += 1
+            print("❌ LLM router: every provider failed")
+            return None
+        name, answer, started = won
+        self._stats[name].record("call", time.perf_counter() - started, ok=True)
+        self._stats[name].wins += 1
+        return answer
+
+    async def astream(self, prompt: str):
+        """
+        Yield tokens from whichever provider produces a first token first.
+        Once a token has been sent the stream is committed to that provider.
+        """
+        self.requests += 1
+        streams = {}  # name -> async generator
+
+        async def first_token(name):
+            streams[name] = PROVIDERS[name][2](prompt)
+            try:
+                return await streams[name].__anext__()
+            except StopAsyncIteration:
+                return None
+
+        try:
+            won = await self._race("stream", self.ranked("stream"), first_token, LLM_HEDGE_MS)
+            if won is None:
+                self.exhausted += 1
+                print("❌ LLM router: every provider failed")
+                return
+            name, token, started = won
+            self._stats[name].record("stream", time.perf_counter() - started, ok=True)
+            self._stats[name].wins += 1
+            yield token
+            async for token in streams[name]:
+                yield token
+        finally:
+            for stream in streams.values():
+                await stream.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "providers": {f"{p}:{PROVIDERS[p][0]}": self._stats[p].summary() for p in self.providers},
+            "ranking": self.ranked("call", probe=False),
+            "hedge_ms": LLM_HEDGE_MS,
+            "hedge_call_ms": LLM_HEDGE_CALL_MS,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "failovers": self.failovers,
+            "exhausted": self.exhausted,
+        }
+
+
+llm_router = LLMRouter()
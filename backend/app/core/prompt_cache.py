@@ -0,0 +1,174 @@
+# ============================================
+# prompt_cache.py
+# Exact-match, content-addressed cache for LLM generations
+# (notes / quiz / MCQ / mind-map endpoints). Key = sha256 of template id,
+# model and the rendered inputs; values persist in MongoDB with LRU
+# eviction, fronted by a small in-process LRU.
+# ============================================
+
+import os
+import json
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+from app.config.db import get_collection
+
+# ====================================================
+# Settings
+# ====================================================
+
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+PROMPT_CACHE_COLLECTION = os.getenv("PROMPT_CACHE_COLLECTION", "llm_prompt_cache")
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "20000"))  # in MongoDB
+PROMPT_CACHE_MEMORY_SIZE = int(os.getenv("PROMPT_CACHE_MEMORY_SIZE", "256"))    # in process
+# Check the MongoDB size bound every this many writes
+PROMPT_CACHE_EVICT_EVERY = 100
+
+
+def prompt_key(template_id: str, model: str, *inputs) -> str:
+    """Content address of one generation request."""
+    payload = json.dumps([template_id, model, list(inputs)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_json_output(output: str) -> bool:
+    """accept= predicate for endpoints that parse the output as JSON."""
+    try:
+        json.loads(output.replace("```json", "").replace("```", "").strip())
+        return True
+    except (ValueError, AttributeError):
+        return False
+
+
+class PromptCache:
+    """
+    Two-level exact-match cache. Identical requests arriving together share
+    one in-flight generation instead of each calling the LLM.
+    """
+
+    def __init__(self, memory_size: int = PROMPT_CACHE_MEMORY_SIZE):
+        self.memory_size = memory_size
+        self._memory = OrderedDict()  # key -> output
+        self._inflight = {}           # key -> asyncio.Future
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def collection(self):
+        return get_collection(PROMPT_CACHE_COLLECTION)
+
+    def _remember(self, key: str, output: str):
+        self._memory[key] = output
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        output = self._memory.get(key)
+        if output is not None:
+            self._memory.move_to_end(key)
+            return output
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": key},
+                {"$set": {"last_used_at": datetime.utcnow()}, "$inc": {"hits": 1}},
+                projection={"output": 1},
+            )
+        except Exception as e:
+            print(f"⚠️ Prompt cache read failed: {e}")
+            return None
+        if doc is None:
+            return None
+        self._remember(key, doc["output"])
+        return doc["output"]
+
+    async def put(self, key: str, template_id: str, model: str, output: str):
+        self._remember(key, output)
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": key},
+                {
+                    "$set": {"output": output, "last_used_at": now},
+                    "$setOnInsert": {"template_id": template_id, "model": model, "created_at": now, "hits": 0},
+                },
+                upsert=True,
+            )
+            self._writes += 1
+            if self._writes % PROMPT_CACHE_EVICT_EVERY == 0:
+                await self._evict()
+        except Exception as e:
+            print(f"⚠️ Prompt cache write failed: {e}")
+
+    async def _evict(self):
+        """Drop least recently used entries beyond PROMPT_CACHE_MAX_ENTRIES."""
+        excess = await self.collection.estimated_document_count() - PROMPT_CACHE_MAX_ENTRIES
+        if excess <= 0:
+            return
+        stale = await self.collection.find({}, {"_id": 1}).sort("last_used_at", 1).limit(excess).to_list(length=excess)
+        await self.collection.delete_many({"_id": {"$in": [d["_id"] for d in stale]}})
+        print(f"🧹 Evicted {len(stale)} prompt cache entries")
+
+    async def cached(
+        self,
+        template_id: str,
+        model: str,
+        inputs: list,
+        generate: Callable[[], Awaitable[str]],
+        accept: Callable[[str], bool] = bool,
+    ) -> str:
+        """
+        Return the stored output for (template_id, model, inputs), or await
+        generate() and store its output if accept(output) holds.
+        """
+        if not PROMPT_CACHE_ENABLED:
+            return await generate()
+
+        key = prompt_key(template_id, model, *inputs)
+        output = await self.get(key)
+        if output is not None:
+            self.hits += 1
+            print(f"⚡ Prompt cache hit for {template_id}")
+            return output
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            output = await generate()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved: there may be no other waiter
+            raise
+        else:
+            future.set_result(output)
+        finally:
+            self._inflight.pop(key, None)
+
+        if output and accept(output):
+            await self.put(key, template_id, model, output)
+        return output
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": PROMPT_CACHE_ENABLED,
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+prompt_cache = PromptCache()
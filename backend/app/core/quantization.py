@@ -0,0 +1,35 @@
+# ============================================
+# quantization.py
+# Compact codes for unit-length embeddings
+# (int8 scalar codes and binary sign codes)
+# ============================================
+
+import numpy as np
+
+# Unit-length vectors have every component in [-1, 1]
+INT8_SCALE = 127.0
+
+
+def quantize_int8(embeddings) -> np.ndarray:
+    """(n, dim) unit vectors → (n, dim) int8 codes (4× smaller than float32)."""
+    embs = np.asarray(embeddings, dtype=np.float32)
+    return np.clip(np.rint(embs * INT8_SCALE), -127, 127).astype(np.int8)
+
+
+def dequantize_int8(codes) -> np.ndarray:
+    """int8 codes → approximate float32 vectors."""
+    return np.asarray(codes, dtype=np.float32) / INT8_SCALE
+
+
+def binary_codes(embeddings) -> np.ndarray:
+    """(n, dim) vectors → (n, dim / 8) uint8 sign bits (32× smaller than float32)."""
+    embs = np.asarray(embeddings, dtype=np.float32)
+    return np.packbits(embs > 0, axis=-1)
+
+
+def recall_at_k(approx_rows, exact_rows) -> float:
+    """Fraction of the exact top-k rows found by the approximate search."""
+    exact = set(int(r) for r in exact_rows)
+    if not exact:
+        return 1.0
+    return len(exact.intersection(int(r) for r in approx_rows)) / len(exact)
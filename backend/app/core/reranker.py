@@ -0,0 +1,101 @@
+# ============================================
+# reranker.py
+# Optional cross-encoder rerank of retrieved chunks
+# (CPU, batched, hard per-request time budget)
+# ============================================
+
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+from dotenv import load_dotenv
+
+# ====================================================
+# Load environment
+# ====================================================
+
+load_dotenv()
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "30"))              # candidates scored
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))   # per request
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.1"))  # drop chunks below
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "8192"))
+
+# ====================================================
+# Model + score cache
+# ====================================================
+
+_model = None
+_model_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+
+_scores = OrderedDict()  # (normalised query, chunk id) -> score
+_scores_lock = threading.Lock()
+
+
+def _get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import CrossEncoder
+            _model = CrossEncoder(RERANK_MODEL, device="cpu")
+            print(f"✅ Loaded rerank model: {RERANK_MODEL}")
+    return _model
+
+
+def _key(query: str, chunk: Dict[str, Any]) -> tuple:
+    return (" ".join(query.lower().split()), chunk.get("source_id") or chunk["text"])
+
+
+def _score_pairs(query: str, chunks: List[Dict[str, Any]]):
+    """Score uncached (query, chunk) pairs in one batch and cache them (runs on the rerank thread)."""
+    scores = _get_model().predict([(query, c["text"]) for c in chunks], batch_size=len(chunks))
+    with _scores_lock:
+        for chunk, score in zip(chunks, scores):
+            _scores[_key(query, chunk)] = float(score)
+        while len(_scores) > RERANK_CACHE_SIZE:
+            _scores.popitem(last=False)
+
+
+async def rerank(query: str, chunks: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Rerank the top RERANK_TOP_N chunks with the cross-encoder and keep the
+    best top_k scoring at least RERANK_MIN_SCORE. If scoring does not finish
+    within RERANK_BUDGET_MS, the incoming order is kept (the scores still land
+    in the cache for the next identical request).
+    """
+    candidates = chunks[:RERANK_TOP_N]
+    if not candidates:
+        return []
+
+    with _scores_lock:
+        missing = [c for c in candidates if _key(query, c) not in _scores]
+
+    if missing:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_executor, _score_pairs, query, missing)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=RERANK_BUDGET_MS / 1000)
+        except asyncio.TimeoutError:
+            print(f"⏱️ Rerank exceeded {RERANK_BUDGET_MS}ms, keeping retrieval order")
+            return candidates[:top_k]
+        except Exception as e:
+            print(f"⚠️ Rerank failed, keeping retrieval order: {e}")
+            return candidates[:top_k]
+
+    with _scores_lock:
+        scored = [(_scores.get(_key(query, c)), c) for c in candidates]
+
+    kept = []
+    for score, chunk in sorted(scored, key=lambda x: x[0] if x[0] is not None else float("-inf"), reverse=True):
+        if score is None or score < RERANK_MIN_SCORE:
+            continue
+        kept.append({**chunk, "rerank_score": score})
+        if len(kept) >= top_k:
+            break
+    print(f"🎯 Reranked {len(candidates)} chunks → kept {len(kept)}")
+    return kept
@@ -0,0 +1,151 @@
+# ============================================
+# retrieval_scope.py
+# Cached per-user retrieval scope: which documents and KB chunks a user's
+# queries may search. Built from a metadata-only projection of `documents`
+# and invalidated whenever a document is uploaded, re-chunked or shared.
+# ============================================
+
+import os
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from bson import ObjectId
+from app.config.db import get_collection
+
+# ====================================================
+# Settings
+# ====================================================
+
+SCOPE_CACHE_USERS = int(os.getenv("SCOPE_CACHE_USERS", "2048"))
+# Safety net for writes that bypass invalidate() (other services, the shell)
+SCOPE_TTL_SECONDS = float(os.getenv("SCOPE_TTL_SECONDS", "300"))
+SCOPE_MAX_DOCUMENTS = 100  # per user, same cap the retriever always used
+
+# Document metadata needed for retrieval and sources; never the bodies
+SCOPE_PROJECTION = {
+    "_id": 1,
+    "filename": 1,
+    "subject": 1,
+    "domain": 1,
+    "type": 1,
+    "level": 1,
+    "file_type": 1,
+    "file_size": 1,
+    "source_type": 1,
+    "s3_url": 1,
+    "chunk_docs_ids": 1,
+    "user_id": 1,
+    "shared_with": 1,
+    "created_at": 1,
+    "centroid_embedding": 1,
+}
+
+
+class UserScope:
+    """One user's searchable documents, their chunk ids and centroids."""
+
+    def __init__(self, docs: List[dict]):
+        self.centroids = {}  # document _id -> unit-normalised centroid
+        self.docs = []
+        for doc in docs:
+            centroid = doc.pop("centroid_embedding", None)
+            if centroid:
+                self.centroids[doc["_id"]] = np.asarray(centroid, dtype=np.float32)
+            self.docs.append(doc)
+        self.loaded_at = time.time()
+
+
+class RetrievalScopeCache:
+    """
+    LRU of UserScope keyed by user id, plus a small cache of which user ids
+    have a student/teacher profile (checked on every chat turn).
+    """
+
+    def __init__(self, max_users: int = SCOPE_CACHE_USERS, ttl: float = SCOPE_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._scopes = OrderedDict()  # user_id -> UserScope
+        self._profiles = OrderedDict()  # (collection, user_id) -> (exists, checked_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- documents ----------
+    async def _load(self, user_id: str) -> UserScope:
+        docs = await get_collection("documents").find(
+            {"user_id": user_id}, SCOPE_PROJECTION
+        ).to_list(length=SCOPE_MAX_DOCUMENTS)
+        return UserScope(docs)
+
+    async def get(self, user_id: str) -> UserScope:
+        with self._lock:
+            scope = self._scopes.get(user_id)
+            if scope is not None and time.time() - scope.loaded_at < self.ttl:
+                self._scopes.move_to_end(user_id)
+                self.hits += 1
+                return scope
+            self.misses += 1
+
+        scope = await self._load(user_id)
+        with self._lock:
+            self._scopes[user_id] = scope
+            self._scopes.move_to_end(user_id)
+            while len(self._scopes) > self.max_users:
+                self._scopes.popitem(last=False)
+        return scope
+
+    async def documents_for(self, user_ids: List[str]) -> List[dict]:
+        """Documents (metadata only) owned by any of user_ids."""
+        docs = []
+        for user_id in dict.fromkeys(user_ids):
+            docs.extend((await self.get(user_id)).docs)
+        return docs
+
+    async def centroids_for(self, user_ids: List[str]) -> Dict[ObjectId, np.ndarray]:
+        centroids = {}
+        for user_id in dict.fromkeys(user_ids):
+            centroids.update((await self.get(user_id)).centroids)
+        return centroids
+
+    def invalidate(self, *user_ids: Optional[str]):
+        """Drop cached scopes; call after a document is added, re-chunked or shared."""
+        with self._lock:
+            for user_id in user_ids:
+                if user_id:
+                    self._scopes.pop(str(user_id), None)
+
+    # ---------- student / teacher profiles ----------
+    async def has_profile(self, collection: str, user_id: Optional[str]) -> bool:
+        """Whether `collection` (students/teachers) has a profile for user_id."""
+        if not user_id or not ObjectId.is_valid(user_id):
+            return False
+        key = (collection, user_id)
+        with self._lock:
+            entry = self._profiles.get(key)
+            # Profiles are never deleted, so a positive answer is kept until evicted
+            if entry is not None and (entry[0] or time.time() - entry[1] < self.ttl):
+                self._profiles.move_to_end(key)
+                return entry[0]
+
+        exists = await get_collection(collection).find_one(
+            {"user_id": ObjectId(user_id)}, {"_id": 1}
+        ) is not None
+        with self._lock:
+            self._profiles[key] = (exists, time.time())
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+        return exists
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "users": len(self._scopes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+retrieval_scope = RetrievalScopeCache()
@@ -3,20 +3,24 @@
 # ============================================
 
 import os
+import asyncio
+import heapq
 import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import traceback
 from app.config.db import get_collection
-from app.core.retriever_cache import embedder
+from app.core.retriever_cache import embedding_cache, knowledge_bases, RRF_K
+from app.core.retrieval_scope import retrieval_scope
+from app.core.reranker import rerank, RERANK_ENABLED, RERANK_TOP_N
 
-# For backward compatibility
-class DummyIndex:
+# For backward compatibility: combined size of the in-process KB indexes
+class KnowledgeBaseIndexes:
     @property
     def ntotal(self):
-        return 0
+        return sum(kb.index.ntotal for kb in knowledge_bases.values())
 
-index = DummyIndex()
+index = KnowledgeBaseIndexes()
 
 def _recency_score(created_at: datetime) -> float:
     """Compute recency bonus (0–1). Newer chunks rank higher."""
@@ -25,6 +29,212 @@ def _recency_score(created_at: datetime) -> float:
     age_days = (datetime.utcnow() - created_at).days
     return max(0, 1 - (age_days / 365))
 
+# Per-KB search budget for the concurrent fan-out (seconds)
+KB_SEARCH_TIMEOUT = float(os.getenv("KB_SEARCH_TIMEOUT", "3.0"))
+# atlas: Atlas $vectorSearch → $text → local fallback
+# hybrid: one pass over the in-process KB (BM25 + vector, RRF fused)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "atlas").lower()
+# Coarse-to-fine: rank the user's documents by centroid similarity and only
+# search the chunks of the best DOC_PREFILTER_TOP_M (0 disables)
+DOC_PREFILTER_TOP_M = int(os.getenv("DOC_PREFILTER_TOP_M", "0"))
+
+
+def _shortlist_documents(user_docs: list, centroids: dict, query_emb: np.ndarray, top_m: int) -> list:
+    """
+    Keep the top_m documents whose centroid embedding is closest to the
+    query. Documents without a centroid (ingested before centroids were
+    stored) are always kept so they are never silently dropped.
+    """
+    ranked = [d for d in user_docs if len(centroids.get(d["_id"], ())) == len(query_emb)]
+    if top_m <= 0 or len(ranked) <= top_m:
+        return user_docs
+
+    mat = np.stack([centroids[d["_id"]] for d in ranked])
+    q = np.asarray(query_emb, dtype=np.float32)
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+    sims = mat @ q
+    keep = {ranked[i]["_id"] for i in np.argpartition(-sims, top_m - 1)[:top_m]}
+
+    shortlisted = [
+        d for d in user_docs
+        if d["_id"] in keep or len(centroids.get(d["_id"], ())) != len(query_emb)
+    ]
+    print(f"📚 Document prefilter: {len(shortlisted)}/{len(user_docs)} documents kept")
+    return shortlisted
+
+
+async def _search_local(
+    kb_name: str,
+    query_text: str,
+    query_emb: np.ndarray,
+    kb_ids: list,
+    chunk_filenames: Dict[str, str],
+    top_k: int,
+) -> List[Dict[str, Any]]:
+    """Hybrid BM25 + vector search over the in-process KB cache."""
+    kb_cache = knowledge_bases.get(kb_name)
+    if kb_cache is None:
+        return []
+    if not kb_cache.ready:
+        # The load runs as its own task, outside KB_SEARCH_TIMEOUT; skip this KB until it is done
+        kb_cache.ensure_loading()
+        print(f"⏳ {kb_name} KB is still loading, skipping local search")
+        return []
+    allowed_ids = {str(_id) for _id in kb_ids}
+    docs = kb_cache.hybrid_search(query_text, query_emb, top_k * 2, allowed_ids=allowed_ids)
+    for d in docs:
+        d["filename"] = chunk_filenames.get(str(d["_id"]), "Unknown")
+    print(f"  Found {len(docs)} local hybrid matches in {kb_name}")
+    return docs
+
+
+async def _search_kb(
+    kb_name: str,
+    query_text: str,
+    query_emb: np.ndarray,
+    kb_ids: list,
+    chunk_filenames: Dict[str, str],
+    top_k: int,
+) -> tuple:
+    """
+    Search one knowledge base: Atlas vector search → text search → local fallback.
+    Returns (kind, results); kind ("vector" / "text" / "hybrid") says which
+    scale the scores are on.
+    """
+    print(f"\n🔎 Searching in {kb_name} collection...")
+    kb_collection = get_collection(f"kb_{kb_name}")
+
+    if RETRIEVAL_MODE == "hybrid":
+        docs = await _search_local(kb_name, query_text, query_emb, kb_ids, chunk_filenames, top_k)
+        return "hybrid", _to_results(kb_name, docs)
+
+    try:
+        # Try vector search
+        print("  Attempting vector search...")
+        pipeline = [
+            {
+                "$vectorSearch": {
+                    "index": "vector_index",
+                    "queryVector": query_emb.tolist(),
+                    "path": "embedding",
+                    # ACL pre-filter: applied before top-k selection,
+                    # needs "_id" as a filter field on vector_index
+                    "filter": {"_id": {"$in": kb_ids}},
+                    "numCandidates": top_k * 20,   # recommended ratio
+                    "limit": top_k * 2
+                }
+            },
+            {
+                "$project": {
+                    "_id": 1,
+                    "chunk_text": 1,
+                    "filename": 1,
+                    "created_at": 1,
+                    "score": {"$meta": "vectorSearchScore"},
+                }
+            }
+        ]
+
+        kind = "vector"
+        cursor = kb_collection.aggregate(pipeline)
+        docs = await cursor.to_list(length=top_k * 2)
+        print(f"Found {len(docs)} vector matches in {kb_name} \n VECTOR SEARCH RAW OUTPUT:")
+
+        for d in docs:
+            # higher score means more useful chunk, index it according to the score, if it improves accuracy
+            # implement mechanism to remove chunks with lower scores like 0.1 and lower
+            print("   →", d.get("chunk_text", "")[:100], "\n   || score:", d.get("score"), "\n")
+
+        # If no vector results, try text search
+        if not docs:
+            print(f"No vector matches in {kb_name}, trying text search...")
+            kind = "text"
+
+            cursor = kb_collection.find(
+                {
+                    "_id": {"$in": kb_ids},
+                    "$text": {
+                        "$search": query_text,
+                        "$caseSensitive": False,
+                        "$diacriticSensitive": False
+                    }
+                },
+                {"chunk_text": 1, "filename": 1, "created_at": 1}
+            ).sort("created_at", -1).limit(top_k * 2)
+            docs = await cursor.to_list(length=top_k * 2)
+            print(f"  Found {len(docs)} text matches in {kb_name}")
+
+    except Exception as e:
+        print(f"⚠️ Search failed for {kb_name}: {str(e)}")
+        print(f"🔄 Falling back to local hybrid search for {kb_name}...")
+
+        # Fallback: local hybrid search over the in-process KB
+        kind = "hybrid"
+        try:
+            docs = await _search_local(kb_name, query_text, query_emb, kb_ids, chunk_filenames, top_k)
+
+        except Exception as local_e:
+            print(f"❌ Local fallback failed: {local_e}")
+            traceback.print_exc()
+            docs = []
+
+    return kind, _to_results(kb_name, docs)
+
+
+def _to_results(kb_name: str, docs: list) -> List[Dict[str, Any]]:
+    """Blend match score with recency and shape results for the graph."""
+    results = []
+    for doc in docs:
+        recency = _recency_score(doc.get("created_at", datetime.utcnow()))
+        score = doc.get("score", 0.5) * 0.8 + recency * 0.2
+        results.append({
+            "text": doc["chunk_text"],
+            "score": float(score),
+            "source": kb_name,
+            "filename": doc.get("filename", "Unknown"),
+            "source_id": str(doc["_id"]),
+            "document_type": "knowledge_base",
+            "created_at": doc.get("created_at", datetime.utcnow().isoformat())
+        })
+    return results
+
+
+async def _search_kb_with_timeout(kb_name: str, *args) -> tuple:
+    """
+    Run _search_kb under KB_SEARCH_TIMEOUT; a slow or failing KB yields no
+    results. KB loads are never awaited here (see _search_local).
+    """
+    try:
+        return await asyncio.wait_for(_search_kb(kb_name, *args), timeout=KB_SEARCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"⏱️ Search in {kb_name} exceeded {KB_SEARCH_TIMEOUT}s, skipping")
+    except Exception as e:
+        print(f"⚠️ Search failed for {kb_name}: {e}")
+    return None, []
+
+
+def _merge_kb_results(per_kb: list, limit: int) -> List[Dict[str, Any]]:
+    """
+    Merge per-KB (kind, results) into one best-first list. Scores are only
+    comparable when every KB answered the same way; otherwise (e.g. one KB
+    fell back to local hybrid search, whose RRF scores top out near 0.5,
+    while others returned Atlas similarities) the KBs are fused by rank.
+    """
+    kinds = {kind for kind, results in per_kb if results}
+    if len(kinds) <= 1:
+        return heapq.nlargest(
+            limit, (r for _, results in per_kb for r in results), key=lambda x: x["score"]
+        )
+
+    fused = []
+    for _, results in per_kb:
+        ranked = sorted(results, key=lambda x: x["score"], reverse=True)
+        for rank, r in enumerate(ranked):
+            fused.append((1.0 / (RRF_K + rank + 1), r["score"], r))
+    print(f"🔀 Mixed score scales {sorted(kinds)}: merging KBs by rank")
+    return [r for _, _, r in heapq.nlargest(limit, fused, key=lambda x: x[:2])]
+
+
 async def retrieve_similar(
     query_text: str,
     user_ids: List[str] = None,
@@ -33,6 +243,8 @@ async def retrieve_similar(
 ) -> List[Dict[str, Any]]:
     """
     Retrieve top-K document chunks relevant to the query from all KBs.
+    The query is embedded once and the KBs are searched concurrently, so
+    latency is that of the slowest KB rather than the sum of all of them.
     Args:
         query_text: The search query
         user_ids: Optional list of user IDs for filtering
@@ -42,183 +254,45 @@ async def retrieve_similar(
     """
     try:
         print(f"🔍 Starting search for: '{query_text}'")
-        model_dim = embedder.get_sentence_embedding_dimension()
-        print("MODEL DIMENSIONS: ", model_dim)
 
-        query_emb = embedder.encode(query_text).astype("float32")
+        query_emb = await embedding_cache.aencode(query_text)
         print("QUERY EMBEDDING: ", query_emb.shape)
-        results = []
-        # Get user's document IDs if user_id is provided
-        user_doc_ids = []
 
-        document_collection = get_collection("documents")
-        user_documents = document_collection.find({"user_id": {"$in": user_ids}})
-        user_docs = await user_documents.to_list(length=100)  # Adjust limit as needed
+        # Cached per-user scope: document metadata and chunk ids, no bodies
+        user_docs = await retrieval_scope.documents_for(user_ids or [])
 
-        # get kb_ids from all the user_docs chunk_docs_ids
+        # Optionally narrow the chunk search to the most relevant documents
+        search_docs = user_docs
+        if DOC_PREFILTER_TOP_M > 0:
+            centroids = await retrieval_scope.centroids_for(user_ids or [])
+            search_docs = _shortlist_documents(user_docs, centroids, query_emb, DOC_PREFILTER_TOP_M)
+
+        # get kb_ids from the selected docs' chunk_docs_ids
         kb_ids = []
-        for doc in user_docs:
+        chunk_filenames = {}
+        for doc in search_docs:
             if "chunk_docs_ids" in doc:
                 kb_ids.extend(doc["chunk_docs_ids"])
-    
-        # Extract all chunk document IDs
-        for doc in user_docs:
-            if "chunk_docs_ids" in doc:
-                user_doc_ids.extend(doc["chunk_docs_ids"])
-        
-        print(f"🔑 Found {len(user_doc_ids)} document chunks for {len(user_ids)} users")
-
-        # Search across all knowledge bases
-        for kb_name in kbs:
-            print(f"\n🔎 Searching in {kb_name} collection...")
-            kb_collection = get_collection(f"kb_{kb_name}")
-            
-            # Try without user filter first
-            query_filter = {}
-            if user_doc_ids:  # Only filter by user's documents if we have any
-                query_filter["_id"] = {"$in": user_doc_ids}
-            
-            try:
-                # First, check if collection has any documents
-                count = await kb_collection.count_documents({"_id": {"$in": kb_ids}})
-                print(f"  Total documents in collection: {count}")
-                
-                if count == 0:
-                    print(f"⚠️ No documents found in {kb_name} collection")
-                    continue
-
-                # Try vector search
-                print("  Attempting vector search...")
-                pipeline = [
-                    {
-                        "$vectorSearch": {
-                            "index": "vector_index",
-                            "queryVector": query_emb.tolist(),
-                            "path": "embedding",
-                            "numCandidates": top_k * 20,   # recommended ratio
-                            "limit": top_k * 2
-                        }
-                    },
-                    {
-                        "$match": {
-                            "_id": {"$in": kb_ids}
-                        }
-                    },
-                    {
-                        "$project": {
-                            "_id": 1,
-                            "chunk_text": 1,
-                            "filename": 1,
-                            "created_at": 1,
-                            "score": {"$meta": "vectorSearchScore"},
-                        }
-                    }
-                ]
-                                
-                cursor = kb_collection.aggregate(pipeline)
-                docs = await cursor.to_list(length=top_k * 2)
-                print(f"Found {len(docs)} vector matches \n VECTOR SEARCH RAW OUTPUT:")
-
-                for d in docs:
-                    # higher score means more useful chunk, index it according to the score, if it improves accuracy
-                    # implement mechanism to remove chunks with lower scores like 0.1 and lower
-                    print("   →", d.get("chunk_text", "")[:100], "\n   || score:", d.get("score"), "\n")
-                
-                # If no vector results, try text search
-                if not docs:
-                    print("No vector matches, trying text search...")
-
-                    cursor = kb_collection.find(
-                        {
-                            "_id": {"$in": kb_ids},
-                            "$text": {
-                                "$search": query_text,
-                                "$caseSensitive": False,
-                                "$diacriticSensitive": False
-                            }
-                        },
-                        {"chunk_text": 1, "filename": 1, "created_at": 1}
-                    ).sort("created_at", -1).limit(top_k * 2)
-                    docs = await cursor.to_list(length=top_k * 2)
-                    print(f"  Found {len(docs)} text matches")
-                    
-            except Exception as e:
-                print(f"⚠️ Search failed for {kb_name}: {str(e)}")
-                print(f"🔄 Falling back to local vector search for {kb_name}...")
-                
-                # Fallback: Local Vector Search using NumPy
-                try:
-                    # Fetch candidate documents with embeddings
-                    cursor = kb_collection.find(
-                        {
-                            "_id": {"$in": kb_ids},
-                            **query_filter
-                        },
-                        {"chunk_text": 1, "filename": 1, "created_at": 1, "embedding": 1}
-                    )
-                    candidate_docs = await cursor.to_list(length=None) # Fetch all candidates
-                    
-                    if not candidate_docs:
-                        print(f"  No candidate documents found for local search in {kb_name}")
-                        docs = []
-                    else:
-                        # Extract embeddings and compute cosine similarity
-                        doc_embeddings = [d.get("embedding") for d in candidate_docs if d.get("embedding")]
-                        valid_docs = [d for d in candidate_docs if d.get("embedding")]
-                        
-                        if not doc_embeddings:
-                            print("  No embeddings found in candidate documents.")
-                            docs = []
-                        else:
-                            doc_embeddings_np = np.array(doc_embeddings)
-                            
-                            # Normalize embeddings for cosine similarity
-                            norm_doc = np.linalg.norm(doc_embeddings_np, axis=1)
-                            norm_query = np.linalg.norm(query_emb)
-                            
-                            # Avoid division by zero
-                            norm_doc[norm_doc == 0] = 1e-10
-                            if norm_query == 0:
-                                norm_query = 1e-10
-                                
-                            # Compute cosine similarity
-                            # query_emb is (dim,), doc_embeddings_np is (n, dim)
-                            dot_products = np.dot(doc_embeddings_np, query_emb)
-                            similarities = dot_products / (norm_doc * norm_query)
-                            
-                            # Attach scores to documents
-                            for i, doc in enumerate(valid_docs):
-                                doc["score"] = float(similarities[i])
-                                
-                            # Sort by score descending
-                            valid_docs.sort(key=lambda x: x["score"], reverse=True)
-                            
-                            # Take top K * 2
-                            docs = valid_docs[:top_k * 2]
-                            print(f"  Found {len(docs)} local vector matches")
-                            
-                except Exception as local_e:
-                    print(f"❌ Local fallback failed: {local_e}")
-                    traceback.print_exc()
-                    docs = []
-
-            # Process results
-            for doc in docs:
-                recency = _recency_score(doc.get("created_at", datetime.utcnow()))
-                score = doc.get("score", 0.5) * 0.8 + recency * 0.2
-                results.append({
-                    "text": doc["chunk_text"],
-                    "score": float(score),
-                    "source": kb_name,
-                    "filename": doc.get("filename", "Unknown"),
-                    "source_id": str(doc["_id"]),
-                    "document_type": "knowledge_base",
-                    "created_at": doc.get("created_at", datetime.utcnow().isoformat())
-                })
-
-        # Sort and return top results
-        results.sort(key=lambda x: x["score"], reverse=True)
-        top_results = results[:top_k]
+                for chunk_id in doc["chunk_docs_ids"]:
+                    chunk_filenames[str(chunk_id)] = doc.get("filename", "Unknown")
+
+        print(f"🔑 Found {len(kb_ids)} document chunks for {len(user_ids)} users")
+        if not kb_ids:
+            return [], user_docs
+
+        # With reranking on, gather a wider candidate pool for the cross-encoder
+        fetch_k = max(top_k, RERANK_TOP_N // 2) if RERANK_ENABLED else top_k
+
+        # Search all knowledge bases concurrently
+        per_kb = await asyncio.gather(*[
+            _search_kb_with_timeout(kb_name, query_text, query_emb, kb_ids, chunk_filenames, fetch_k)
+            for kb_name in kbs
+        ])
+
+        # Merge into a single top-k
+        top_results = _merge_kb_results(per_kb, RERANK_TOP_N if RERANK_ENABLED else top_k)
+        if RERANK_ENABLED:
+            top_results = await rerank(query_text, top_results, top_k)
         print(f"\n🏆 Top {len(top_results)} results found")
         return top_results, user_docs
 
@@ -226,5 +300,3 @@ async def retrieve_similar(
         print(f"❌ Retrieval failed: {e}")
         traceback.print_exc()
         return []
-
-
@@ -5,11 +5,26 @@
 # ============================================
 
 import os
+import time
+import asyncio
+import heapq
+import itertools
+import threading
+import pickle
+import functools
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from app.config.db import db
 import numpy as np
+import faiss
 from sentence_transformers import SentenceTransformer
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
 from dotenv import load_dotenv
+from app.core.quantization import binary_codes
+from app.core.bm25 import BM25Index
+from app.core.kb_snapshot import read_snapshot, write_snapshot
+from app.core.embedding_codec import encode_embedding, decode_embedding
 
 # ====================================================
 # Load environment
@@ -25,6 +40,397 @@ EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM
 embedder = SentenceTransformer(EMBEDDING_MODEL)
 EMBEDDING_DIM = embedder.get_sentence_embedding_dimension()
 
+# ====================================================
+# Embedding Service (encode() off the event loop)
+# ====================================================
+
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+EMBEDDING_QUEUE_SIZE = int(os.getenv("EMBEDDING_QUEUE_SIZE", "1024"))
+# Texts per forward pass (EMBEDDING_BATCH_SIZE is the older name of this setting)
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", os.getenv("EMBEDDING_BATCH_SIZE", "64")))
+# How long a batch waits for more concurrent requests before running
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "3"))
+
+PRIORITY_QUERY = 0  # interactive, single texts
+PRIORITY_BULK = 1   # ingestion
+
+
+class EmbeddingService:
+    """
+    Runs encode() on a dedicated thread pool behind a bounded priority queue.
+    Requests from concurrent callers are micro-batched: a batch collects
+    requests for up to EMBEDDING_BATCH_WAIT_MS or EMBEDDING_MAX_BATCH texts,
+    then runs as one forward pass. Bulk requests are split into EMBEDDING_MAX_BATCH slices so interactive
+    queries never wait behind a whole document.
+    """
+
+    def __init__(self, model: SentenceTransformer, workers: int = EMBEDDING_WORKERS,
+                 queue_size: int = EMBEDDING_QUEUE_SIZE, max_batch: int = EMBEDDING_MAX_BATCH,
+                 max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        self.model = model
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedder")
+        self._queue = None  # created lazily on the running loop
+        self._tasks = []
+        self._seq = itertools.count()
+        self.batches = 0
+        self.items = 0
+        self._latencies = deque(maxlen=1000)  # ms, enqueue → result
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def embed_many(self, texts: list, priority: int = PRIORITY_BULK) -> np.ndarray:
+        """Embeddings of texts as an (n, dim) float32 matrix."""
+        if not texts:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for start in range(0, len(texts), self.max_batch):
+            future = loop.create_future()
+            item = (texts[start:start + self.max_batch], future, time.perf_counter())
+            await self._queue.put((priority, next(self._seq), item))  # waits when full
+            futures.append(future)
+        parts = await asyncio.gather(*futures)
+        return parts[0] if len(parts) == 1 else np.vstack(parts)
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embedding of one interactive text as a (dim,) float32 array."""
+        return (await self.embed_many([text], priority=PRIORITY_QUERY))[0]
+
+    async def _next_batch(self) -> list:
+        """Collect queued requests until max_batch texts or the wait window closes."""
+        batch = [(await self._queue.get())[2]]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            if self._queue.empty():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                entry = self._queue.get_nowait()
+            batch.append(entry[2])
+            size += len(entry[2][0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            texts = [t for item in batch for t in item[0]]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._encode, texts)
+            except Exception as e:
+                print(f"❌ Embedding batch failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            self.batches += 1
+            self.items += len(texts)
+            now = time.perf_counter()
+            offset = 0
+            for item_texts, future, enqueued_at in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+                self._latencies.append((now - enqueued_at) * 1000)
+
+    def _encode(self, texts: list) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=self.max_batch), dtype=np.float32)
+
+    def stats(self) -> dict:
+        latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        }
+
+
+embedding_service = EmbeddingService(embedder)
+
+# ====================================================
+# Embedding Cache (shared by retriever, memory and save paths)
+# ====================================================
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "3600"))  # seconds
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU + TTL cache of text embeddings keyed by (model, normalised text).
+    Cached vectors are float32 and read-only.
+    """
+
+    def __init__(self, model: SentenceTransformer, model_name: str,
+                 max_size: int = EMBEDDING_CACHE_SIZE, ttl: int = EMBEDDING_CACHE_TTL):
+        self.model = model
+        self.model_name = model_name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Only fold case when the tokenizer does so anyway
+        tokenizer = getattr(model, "tokenizer", None)
+        self._lowercase = bool(getattr(tokenizer, "do_lower_case", False))
+
+    def _key(self, text: str) -> tuple:
+        text = " ".join(text.split())
+        return (self.model_name, text.lower() if self._lowercase else text)
+
+    def _get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, key: tuple, embedding: np.ndarray):
+        embedding.flags.writeable = False
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def encode(self, text: str) -> np.ndarray:
+        """Embedding of one text as a (dim,) float32 array."""
+        key = self._key(text)
+        embedding = self._get(key)
+        if embedding is None:
+            embedding = np.asarray(self.model.encode(text), dtype=np.float32)
+            self._put(key, embedding)
+        return embedding
+
+    def encode_many(self, texts: list) -> np.ndarray:
+        """Embeddings of many texts as an (n, dim) float32 matrix; misses are encoded in one batch."""
+        out = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        keys = [self._key(t) for t in texts]
+        missing = []
+        for i, key in enumerate(keys):
+            embedding = self._get(key)
+            if embedding is None:
+                missing.append(i)
+            else:
+                out[i] = embedding
+        if missing:
+            encoded = np.asarray(self.model.encode([texts[i] for i in missing]), dtype=np.float32)
+            for i, embedding in zip(missing, encoded):
+                out[i] = embedding
+                self._put(keys[i], embedding.copy())
+        return out
+
+    async def aencode(self, text: str) -> np.ndarray:
+        """Like encode(), but a miss is computed by the embedding service off the event loop."""
+        key = self._key(text)
+        embedding = self._get(key)
+        if embedding is None:
+            embedding = (await embedding_service.embed(text)).copy()
+            self._put(key, embedding)
+        return embedding
+
+    async def aencode_many(self, texts: list) -> np.ndarray:
+        """Like encode_many(), but misses are computed by the embedding service."""
+        out = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        keys = [self._key(t) for t in texts]
+        missing = []
+        for i, key in enumerate(keys):
+            embedding = self._get(key)
+            if embedding is None:
+                missing.append(i)
+            else:
+                out[i] = embedding
+        if missing:
+            encoded = await embedding_service.embed_many(
+                [texts[i] for i in missing], priority=PRIORITY_QUERY
+            )
+            for i, embedding in zip(missing, encoded):
+                out[i] = embedding
+                self._put(keys[i], embedding.copy())
+        return out
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache(embedder, EMBEDDING_MODEL)
+
+# ====================================================
+# ANN Index settings (HNSW, inner product on normalised vectors)
+# ====================================================
+
+HNSW_M = int(os.getenv("KB_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("KB_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("KB_HNSW_EF_SEARCH", "64"))
+# Filtered searches over at most this many rows skip HNSW and score exactly.
+EXACT_SEARCH_MAX_ROWS = int(os.getenv("KB_EXACT_SEARCH_MAX_ROWS", "20000"))
+# Codes held by the HNSW graph: none (float32) | int8 (scalar) | binary (sign bits).
+# Quantised indexes return KB_RERANK_CANDIDATES hits that are rescored exactly.
+KB_QUANTIZATION = os.getenv("KB_QUANTIZATION", "none").lower()
+RERANK_CANDIDATES = int(os.getenv("KB_RERANK_CANDIDATES", "200"))
+# Binary indexes have no search-time filter: a filtered search fetches this
+# many times the candidates (capped at the index size) and drops masked rows.
+BINARY_FILTER_OVERFETCH = max(1, int(os.getenv("KB_BINARY_FILTER_OVERFETCH", "4")))
+# Reciprocal-rank fusion constant for hybrid (BM25 + vector) search
+RRF_K = int(os.getenv("KB_RRF_K", "60"))
+
+
+def _new_index(quantization: str = KB_QUANTIZATION):
+    """Create an empty HNSW index scoring by cosine similarity."""
+    if quantization == "binary":
+        index = faiss.IndexBinaryHNSW(EMBEDDING_DIM, HNSW_M)
+    elif quantization == "int8":
+        index = faiss.IndexHNSWSQ(
+            EMBEDDING_DIM, faiss.ScalarQuantizer.QT_8bit_uniform, HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+        # Unit vectors: fix the quantiser range to [-1, 1] instead of learning it
+        index.train(np.stack([-np.ones(EMBEDDING_DIM), np.ones(EMBEDDING_DIM)]).astype(np.float32))
+    else:
+        index = faiss.IndexHNSWFlat(EMBEDDING_DIM, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def _flat_view(index) -> np.ndarray:
+    """
+    Zero-copy (ntotal, dim) view of an IndexHNSWFlat's float32 storage.
+    Only valid until the next add (the storage may be reallocated).
+    """
+    n = index.ntotal
+    if n == 0:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    storage = faiss.downcast_index(index.storage)
+    view = faiss.rev_swig_ptr(storage.get_xb(), n * EMBEDDING_DIM).reshape(n, EMBEDDING_DIM)
+    view.flags.writeable = False
+    return view
+
+
+def _normalize(embeddings) -> np.ndarray:
+    """Return a contiguous (n, dim) float32 copy with unit-length rows."""
+    embs = np.array(embeddings, dtype=np.float32, ndmin=2, copy=True)
+    faiss.normalize_L2(embs)
+    return embs
+
+# ====================================================
+# Columnar storage helpers
+# ====================================================
+
+INITIAL_CAPACITY = 1024
+EPOCH = datetime(1970, 1, 1)
+
+# ====================================================
+# Delta sync settings
+# ====================================================
+
+# Re-read this many seconds behind the high-water mark: ObjectIds minted by
+# other workers in the same second are not strictly ordered.
+SYNC_OVERLAP_SECONDS = int(os.getenv("KB_SYNC_OVERLAP_SECONDS", "5"))
+# Rebuild the index once this fraction of rows has been deleted.
+COMPACT_DEAD_RATIO = float(os.getenv("KB_COMPACT_DEAD_RATIO", "0.25"))
+# Tail a change stream (replica set / Atlas only) instead of polling.
+USE_CHANGE_STREAM = os.getenv("KB_CHANGE_STREAM", "false").lower() == "true"
+# Otherwise poll: delta-sync every loaded KB this often (seconds, 0 = off),
+# so other workers' uploads become searchable here.
+SYNC_INTERVAL_SECONDS = int(os.getenv("KB_SYNC_INTERVAL_SECONDS", "30"))
+
+# Documents per cursor batch when streaming a collection into the cache;
+# only one batch of raw BSON / Python lists is alive at a time.
+LOAD_BATCH_SIZE = int(os.getenv("KB_LOAD_BATCH_SIZE", "2000"))
+# Print load progress every this many rows.
+LOAD_PROGRESS_EVERY = int(os.getenv("KB_LOAD_PROGRESS_EVERY", "50000"))
+
+
+async def iter_batches(cursor, batch_size: int = LOAD_BATCH_SIZE):
+    """Group an async Mongo cursor into lists of at most batch_size documents."""
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ====================================================
+# Snapshot settings
+# ====================================================
+
+# Persist each KB under DATA_DIR/kb_snapshots and restore it on restart
+# (memory-mapped), delta-syncing from MongoDB instead of a full reload.
+USE_SNAPSHOT = os.getenv("KB_SNAPSHOT", "true").lower() == "true"
+# Re-snapshot once this many rows were added since the last one.
+SNAPSHOT_EVERY_ROWS = int(os.getenv("KB_SNAPSHOT_EVERY_ROWS", "10000"))
+# Older snapshots are ignored (deletes are not replayed by delta sync).
+SNAPSHOT_MAX_AGE_HOURS = float(os.getenv("KB_SNAPSHOT_MAX_AGE_HOURS", "24"))
+
+
+def _grow(arr: np.ndarray, rows: int) -> np.ndarray:
+    """Return a copy of arr with room for `rows` leading entries."""
+    grown = np.empty((rows,) + arr.shape[1:], dtype=arr.dtype)
+    grown[:len(arr)] = arr
+    return grown
+
+
+def _to_timestamp(created_at) -> float:
+    """Seconds since epoch (naive UTC) for a datetime or ISO string."""
+    if not created_at:
+        created_at = datetime.utcnow()
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return (created_at - EPOCH).total_seconds()
+
+def _locked(method):
+    """
+    Run a KnowledgeBaseCache method under the cache's row mutex: loads and
+    delta syncs append rows from executor threads while searches read them
+    on the event loop.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._mutex:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 # ====================================================
 # Knowledge Base Registry
 # ====================================================
@@ -33,63 +439,649 @@ class KnowledgeBaseCache:
     """
     Manages an in-memory cache of embeddings and metadata.
     Supports dynamic reload and fallback if MongoDB fails.
+
+    Chunks are held column-wise: one contiguous, pre-normalised (N, dim)
+    float32 matrix plus parallel id / created_at / text-offset arrays,
+    grown by doubling. Row i of the matrix is vector i of the HNSW index.
+    With the default float index the matrix is a view of the index's own
+    flat storage, so every vector is held once. With quantization=
+    "int8"/"binary" the index holds compact codes and its candidates are
+    rescored against a separate float32 matrix.
+    The whole cache is snapshotted to disk and restored on restart, with
+    the index (and matrix) memory-mapped so workers share their pages
+    until the first write.
     """
 
-    def __init__(self, name: str, collection_name: str):
+    def __init__(self, name: str, collection_name: str, quantization: str = KB_QUANTIZATION):
         self.name = name
+        self.quantization = quantization
         self.collection = db[collection_name]
         self.embedder = embedder
-        self.data = []
         self.last_loaded = None
+        self.high_water = None  # largest _id seen by load_data/sync
+        self._watch_task = None
+        self._load_lock = asyncio.Lock()
+        self._mutex = threading.RLock()
+        self._load_task = None
+        self._snapshot_task = None
+        self._compact_task = None
+        self._snapshot_size = 0  # rows covered by the last snapshot
+        self.load_stats = {}
+        self._reset()
+
+    def _reset(self, capacity: int = INITIAL_CAPACITY):
+        """Drop all cached chunks and preallocate `capacity` rows."""
+        capacity = max(capacity, INITIAL_CAPACITY)
+        self.size = 0
+        self.ids = np.empty((capacity, 12), dtype=np.uint8)  # ObjectId bytes
+        self.created_at = np.empty(capacity, dtype=np.float64)
+        self.text_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.dead = 0
+        self._texts = bytearray()
+        self._row_of = {}
+        self.index = _new_index(self.quantization)
+        self._mapped = False  # index is a read-only memory map of a snapshot
+        if self._owns_matrix:
+            self.embeddings = np.empty((capacity, EMBEDDING_DIM), dtype=np.float32)
+        else:
+            self.embeddings = _flat_view(self.index)
+        self.bm25 = BM25Index()
+
+    @property
+    def _owns_matrix(self) -> bool:
+        """Quantised indexes keep no floats, so the cache holds its own matrix."""
+        return self.quantization != "none"
+
+    # Attributes that make up the cached state, swapped as one by _adopt
+    _STATE = (
+        "size", "embeddings", "ids", "created_at", "text_offsets", "alive",
+        "dead", "_texts", "_row_of", "index", "_mapped", "bm25", "high_water",
+    )
+
+    @_locked
+    def _adopt(self, other: "KnowledgeBaseCache"):
+        """Take over another cache's state (no awaits, so searches never see a partial load)."""
+        for attr in self._STATE:
+            setattr(self, attr, getattr(other, attr))
+
+    def _reserve(self, extra: int):
+        """Ensure room for `extra` more rows (amortised doubling)."""
+        capacity = len(self.created_at)
+        needed = self.size + extra
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        if self._owns_matrix:
+            self.embeddings = _grow(self.embeddings, capacity)
+        self.ids = _grow(self.ids, capacity)
+        self.created_at = _grow(self.created_at, capacity)
+        self.text_offsets = _grow(self.text_offsets, capacity + 1)
+        self.alive = _grow(self.alive, capacity)
 
-    async def load_data(self, force: bool = False):
-        """Loads data from MongoDB if not cached or force=True."""
-        if self.data and not force:
-            return self.data
+    @_locked
+    def _append(self, docs: list):
+        """Add chunk documents (with _id, chunk_text, embedding) not already cached."""
+        docs = [
+            d for d in docs
+            if d.get("embedding") is not None and len(d["embedding"])
+            and d.get("_id") is not None
+            and str(d["_id"]) not in self._row_of
+        ]
+        if not docs:
+            return
 
+        # A chunk embedded by another model (wrong length) is skipped, not
+        # allowed to abort the whole load
+        decoded = [decode_embedding(d["embedding"]) for d in docs]
+        wrong = sum(1 for vec in decoded if vec.size != EMBEDDING_DIM)
+        if wrong:
+            print(f"⚠️ Skipping {wrong} chunks in {self.name} KB with embeddings "
+                  f"of the wrong dimension (expected {EMBEDDING_DIM})")
+            keep = [i for i, vec in enumerate(decoded) if vec.size == EMBEDDING_DIM]
+            docs, decoded = [docs[i] for i in keep], [decoded[i] for i in keep]
+        if not docs:
+            return
+
+        start, end = self.size, self.size + len(docs)
+        self._reserve(len(docs))
+        vectors = np.empty((len(docs), EMBEDDING_DIM), dtype=np.float32)
+        for i, vec in enumerate(decoded):
+            vectors[i] = vec.ravel()
+        faiss.normalize_L2(vectors)
+        if self._owns_matrix:
+            self.embeddings[start:end] = vectors
+
+        for row, doc in enumerate(docs, start):
+            chunk_id = str(doc["_id"])
+            self.ids[row] = np.frombuffer(ObjectId(chunk_id).binary, dtype=np.uint8)
+            self.created_at[row] = _to_timestamp(doc.get("created_at"))
+            self._texts.extend(doc.get("chunk_text", "").encode("utf-8"))
+            self.text_offsets[row + 1] = len(self._texts)
+            self._row_of[chunk_id] = row
+            self.bm25.add(row, doc.get("chunk_text", ""))
+
+        self.alive[start:end] = True
+        self._index_add(vectors)
+        self.size = end
+
+    @_locked
+    def _remove(self, chunk_ids) -> int:
+        """Tombstone cached rows; schedules a compaction once too many rows are dead."""
+        removed = 0
+        for chunk_id in chunk_ids:
+            row = self._row_of.pop(str(chunk_id), None)
+            if row is not None:
+                self.alive[row] = False
+                removed += 1
+        self.dead += removed
+        if self.size and self.dead / self.size > COMPACT_DEAD_RATIO:
+            self._schedule_compact()
+        return removed
+
+    def _schedule_compact(self):
+        if self._compact_task is None or self._compact_task.done():
+            self._compact_task = asyncio.create_task(self._compact_in_background())
+
+    async def _compact_in_background(self):
+        """Rebuild the index without tombstoned rows in a worker thread."""
+        try:
+            async with self._load_lock:
+                staging = KnowledgeBaseCache(self.name, self.collection.name, self.quantization)
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._compact, staging)
+        except Exception as e:
+            print(f"⚠️ Compaction failed for {self.name}: {e}")
+
+    def _live_docs(self, start: int, end: int) -> list:
+        """Live rows in [start, end) as the chunk documents _append takes."""
+        return [
+            {
+                "_id": self.chunk_id(row),
+                "chunk_text": self.text(row),
+                "embedding": self.embeddings[row].copy(),
+                "created_at": self.created(row),
+            }
+            for row in np.flatnonzero(self.alive[start:end]) + start
+        ]
+
+    def _compact(self, staging: "KnowledgeBaseCache"):
+        """
+        Drop tombstoned rows: rebuild the live ones into `staging` (searches
+        keep using the current index meanwhile), then adopt it. Rows added
+        or removed during the rebuild are carried over under the mutex.
+        """
+        with self._mutex:
+            n = self.size
+            docs = self._live_docs(0, n)
+        staging._reset(capacity=len(docs))
+        staging._append(docs)
+
+        with self._mutex:
+            staging._append(self._live_docs(n, self.size))
+            for chunk_id in [c for c in staging._row_of if c not in self._row_of]:
+                staging.alive[staging._row_of.pop(chunk_id)] = False
+                staging.dead += 1
+            staging.high_water = self.high_water
+            self._adopt(staging)
+        print(f"🧹 Compacted {self.name} KB to {self.size - self.dead} records.")
+
+    def _advance(self, docs: list):
+        """Move the high-water mark past the given Mongo documents."""
+        for doc in docs:
+            _id = doc.get("_id")
+            if isinstance(_id, ObjectId) and (self.high_water is None or _id > self.high_water):
+                self.high_water = _id
+
+    # ---------- row accessors ----------
+
+    def chunk_id(self, row: int) -> ObjectId:
+        return ObjectId(self.ids[row].tobytes())
+
+    def text(self, row: int) -> str:
+        return self._texts[self.text_offsets[row]:self.text_offsets[row + 1]].decode("utf-8")
+
+    def created(self, row: int) -> datetime:
+        return EPOCH + timedelta(seconds=float(self.created_at[row]))
+
+    def _result(self, row: int, score: float) -> dict:
+        return {
+            "_id": self.chunk_id(row),
+            "chunk_text": self.text(row),
+            "created_at": self.created(row),
+            "score": float(score),
+        }
+
+    # ---------- sync with MongoDB ----------
+
+    @property
+    def ready(self) -> bool:
+        """True once a full load or snapshot restore has completed."""
+        return self.last_loaded is not None
+
+    def ensure_loading(self) -> asyncio.Task:
+        """
+        Start the first load_data() as a background task (once) and return it.
+        Searches must not await it under a timeout: cancelling a load midway
+        would leave the KB unloaded forever.
+        """
+        if self._load_task is None or (self._load_task.done() and not self.ready):
+            self._load_task = asyncio.create_task(self.load_data())
+        return self._load_task
+
+    async def load_data(self, force: bool = False, on_progress=None):
+        """
+        Loads data on first use (or when force=True). Restores the on-disk
+        snapshot and delta-syncs when one exists; otherwise, or when forced,
+        reads the whole collection from MongoDB, streamed in cursor batches
+        into a staging cache that replaces the live one in a single step.
+        """
+        if self.ready and not force:
+            return self.size
+
+        async with self._load_lock:
+            # Another request may have finished loading while we waited
+            if self.ready and not force:
+                return self.size
+
+            if not force and USE_SNAPSHOT and await self._restore_snapshot():
+                await self.sync()
+                self._start_watch()
+                return self.size
+
+            try:
+                staging = await self._stream_collection(on_progress)
+                self._adopt(staging)
+                self.last_loaded = datetime.utcnow()
+                print(f"✅ Loaded {self.size} records from {self.name} knowledge base.")
+                self._schedule_snapshot()
+                self._start_watch()
+                return self.size
+
+            except Exception as e:
+                print(f"⚠️ MongoDB load failed for {self.name}: {e}")
+                # Keep serving whatever was cached before the failed reload
+                return self.size
+
+    async def _stream_collection(self, on_progress=None) -> "KnowledgeBaseCache":
+        """
+        Stream the whole collection into a fresh cache in cursor batches.
+        The matrix is preallocated from the collection's estimated count, so
+        peak memory is the final cache plus one batch.
+        on_progress(kb_name, loaded, expected) is called after every batch.
+        """
+        started = time.perf_counter()
+        expected = await self.collection.estimated_document_count()
+        staging = KnowledgeBaseCache(self.name, self.collection.name, self.quantization)
+        staging._reset(capacity=expected)
+        staging.high_water = None
+
+        cursor = self.collection.find(
+            {}, {"chunk_text": 1, "embedding": 1, "created_at": 1}, batch_size=LOAD_BATCH_SIZE
+        )
+        loop = asyncio.get_running_loop()
+        next_report = LOAD_PROGRESS_EVERY
+        async for batch in iter_batches(cursor):
+            # Decoding, HNSW inserts and BM25 tokenising run off the event loop
+            await loop.run_in_executor(None, staging._append, batch)
+            staging._advance(batch)
+            if on_progress is not None:
+                on_progress(self.name, staging.size, expected)
+            if staging.size >= next_report:
+                print(f"⏳ {self.name} KB: loaded {staging.size}/{expected} records...")
+                next_report += LOAD_PROGRESS_EVERY
+
+        seconds = time.perf_counter() - started
+        self.load_stats = {
+            "rows": staging.size,
+            "expected": expected,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(staging.size / seconds, 1) if seconds else 0.0,
+            "source": "mongo",
+        }
+        return staging
+
+    async def sync(self):
+        """
+        Delta-sync: apply only chunks inserted since the last load/sync.
+        A cache that was never loaded gets the normal first load instead
+        (snapshot restore when available).
+        """
+        if not self.ready:
+            return await self.load_data()
+
+        query = {}  # loaded from an empty collection: everything is new
+        if self.high_water is not None:
+            since = ObjectId.from_datetime(
+                self.high_water.generation_time - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+            )
+            query = {"_id": {"$gt": since}}
+        try:
+            cursor = self.collection.find(
+                query,
+                {"chunk_text": 1, "embedding": 1, "created_at": 1},
+                batch_size=LOAD_BATCH_SIZE,
+            )
+            loop = asyncio.get_running_loop()
+            before = self.size
+            async for batch in iter_batches(cursor):
+                await loop.run_in_executor(None, self._append, batch)
+                self._advance(batch)
+            self.last_loaded = datetime.utcnow()
+            if self.size > before:
+                print(f"🔄 Synced {self.size - before} new records into {self.name} KB.")
+            if self.size - self._snapshot_size >= SNAPSHOT_EVERY_ROWS:
+                self._schedule_snapshot()
+        except Exception as e:
+            print(f"⚠️ Delta sync failed for {self.name}: {e}")
+        return self.size
+
+    # ---------- snapshots ----------
+
+    async def _restore_snapshot(self) -> bool:
+        """Adopt the on-disk snapshot if it matches this model and config."""
         try:
-            cursor = self.collection.find({}, {"chunk_text": 1, "embedding": 1, "created_at": 1})
-            data = []
-            async for doc in cursor:
-                embedding = np.array(doc["embedding"], dtype=np.float32)
-                created_at = (
-                    datetime.fromisoformat(doc["created_at"])
-                    if isinstance(doc["created_at"], str)
-                    else doc["created_at"]
-                )
-                data.append({
-                    "text": doc["chunk_text"],
-                    "embedding": embedding,
-                    "created_at": created_at,
-                    "source_type": self.name,
-                })
-
-            self.data = data
+            loop = asyncio.get_running_loop()
+            snapshot = await loop.run_in_executor(
+                None, read_snapshot, self.name, self.quantization == "binary"
+            )
+            if snapshot is None:
+                return False
+            meta, columns, texts, index, bm25 = snapshot
+
+            n = meta["size"]
+            age_hours = (time.time() - meta["saved_at"]) / 3600
+            if (
+                meta["model"] != EMBEDDING_MODEL
+                or meta["dim"] != EMBEDDING_DIM
+                or meta["quantization"] != self.quantization
+                or not meta.get("high_water")
+                or age_hours > SNAPSHOT_MAX_AGE_HOURS
+                or index.ntotal != n
+                or len(bm25) != n
+            ):
+                print(f"⚠️ Ignoring stale or incompatible snapshot for {self.name} KB.")
+                return False
+
+            await loop.run_in_executor(None, self._adopt_snapshot, meta, columns, texts, index, bm25)
             self.last_loaded = datetime.utcnow()
-            print(f"✅ Loaded {len(data)} records from {self.name} knowledge base.")
-            return data
+            self.load_stats = {"rows": n, "expected": n, "source": "snapshot"}
+            print(f"💾 Restored {n} records for {self.name} KB from snapshot.")
+            return True
+
+        except Exception as e:
+            print(f"⚠️ Snapshot restore failed for {self.name}: {e}")
+            self._reset()
+            self.high_water = None
+            return False
+
+    @_locked
+    def _adopt_snapshot(self, meta: dict, columns: dict, texts: bytes, index, bm25):
+        """Take over a validated snapshot's columns, index and BM25 state."""
+        n = meta["size"]
+        if self._owns_matrix:
+            capacity = len(columns["embeddings"])
+            self.embeddings = columns["embeddings"]  # memory-mapped, copy-on-write
+        else:
+            capacity = n + max(INITIAL_CAPACITY, n // 8)
+            self.embeddings = _flat_view(index)
+        self.ids = _grow(columns["ids"], capacity)
+        self.created_at = _grow(columns["created_at"], capacity)
+        self.text_offsets = _grow(columns["text_offsets"], capacity + 1)
+        self.alive = _grow(columns["alive"], capacity)
+        self._texts = bytearray(texts)
+        live = np.flatnonzero(self.alive[:n])
+        self._row_of = {self.ids[row].tobytes().hex(): int(row) for row in live}
+        self.dead = n - len(live)
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        self.index = index
+        self._mapped = True
+        self.bm25 = bm25
+        self.size = n
+        self.high_water = ObjectId(meta["high_water"])
+        self._snapshot_size = n
+
+    async def save_snapshot(self):
+        """
+        Write the cache to disk. Capture, serialisation and file I/O all
+        run in a worker thread; searches only wait for the capture.
+        """
+        if not self.size or self.high_water is None:
+            return
+        try:
+            async with self._load_lock:
+                loop = asyncio.get_running_loop()
+                n, path = await loop.run_in_executor(None, self._write_snapshot)
+            self._snapshot_size = n
+            print(f"💾 Snapshot of {self.name} KB ({n} records) written to {path}")
+        except Exception as e:
+            print(f"⚠️ Snapshot failed for {self.name}: {e}")
 
+    def _write_snapshot(self) -> tuple:
+        """
+        Capture the cache under the row mutex (rows below `size` are never
+        rewritten in place), then write it. Runs in a worker thread.
+        """
+        with self._mutex:
+            n = self.size
+            columns = {
+                "ids": self.ids[:n].copy(),
+                "created_at": self.created_at[:n].copy(),
+                "text_offsets": self.text_offsets[:n + 1].copy(),
+                "alive": self.alive[:n].copy(),
+            }
+            if self._owns_matrix:
+                # The float index carries its vectors; only quantised KBs need the matrix
+                columns["embeddings"] = self.embeddings[:n]
+            texts = bytes(self._texts[:self.text_offsets[n]])
+            serialize = faiss.serialize_index_binary if self.quantization == "binary" else faiss.serialize_index
+            index_bytes = serialize(self.index)
+            bm25_bytes = pickle.dumps(self.bm25, protocol=pickle.HIGHEST_PROTOCOL)
+            meta = {
+                "model": EMBEDDING_MODEL,
+                "dim": EMBEDDING_DIM,
+                "quantization": self.quantization,
+                "size": n,
+                "high_water": str(self.high_water),
+                "saved_at": time.time(),
+            }
+        # Spare rows so post-restart appends fit in the mapped matrix
+        capacity = n + max(INITIAL_CAPACITY, n // 8)
+        return n, write_snapshot(self.name, meta, columns, capacity, texts, index_bytes, bm25_bytes)
+
+    def _schedule_snapshot(self):
+        if USE_SNAPSHOT and (self._snapshot_task is None or self._snapshot_task.done()):
+            self._snapshot_task = asyncio.create_task(self.save_snapshot())
+
+    def _start_watch(self):
+        if USE_CHANGE_STREAM and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self.watch())
+
+    async def watch(self):
+        """Tail the collection's change stream, applying inserts and deletes."""
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "delete"]}}}]
+        try:
+            async with self.collection.watch(pipeline) as stream:
+                print(f"👀 Watching {self.name} KB change stream.")
+                async for change in stream:
+                    if change["operationType"] == "insert":
+                        doc = change["fullDocument"]
+                        self._append([doc])
+                        self._advance([doc])
+                    else:
+                        self._remove([change["documentKey"]["_id"]])
         except Exception as e:
-            print(f"⚠️ MongoDB load failed for {self.name}: {e}")
-            self.data = []
-            return []
+            print(f"⚠️ Change stream unavailable for {self.name}, using delta sync: {e}")
+        finally:
+            self._watch_task = None
+
+    def add_documents(self, docs: list):
+        """
+        Add freshly stored chunk documents to the cache without reloading.
+        Skipped while the cache was never loaded: its first load reads them.
+        """
+        if self.ready:
+            self._append(docs)
+
+    def remove_documents(self, chunk_ids) -> int:
+        """Drop deleted chunks from the cache without reloading."""
+        return self._remove(chunk_ids)
 
     async def add_entry(self, chunk_text: str):
         """Embed and insert a new chunk to MongoDB and cache."""
-        embedding = self.embedder.encode(chunk_text).astype("float32").tolist()
+        embedding = await embedding_cache.aencode(chunk_text)
         doc = {
             "chunk_text": chunk_text,
-            "embedding": embedding,
+            "embedding": encode_embedding(embedding),
             "created_at": datetime.utcnow().isoformat(),
             "source_type": self.name,
         }
         try:
             await self.collection.insert_one(doc)
-            self.data.append(doc)
+            self.add_documents([doc])
             print(f"🧠 Added new chunk to {self.name} KB.")
         except Exception as e:
             print(f"❌ Failed to insert chunk into {self.name} KB: {e}")
 
+    # ---------- search ----------
+
+    @_locked
+    def rows_for(self, chunk_ids) -> np.ndarray:
+        """Rows of the live cached chunks among chunk_ids (unknown ids are skipped)."""
+        rows = [self._row_of.get(str(chunk_id)) for chunk_id in chunk_ids]
+        return np.array(sorted(r for r in rows if r is not None), dtype=np.int64)
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, scores: np.ndarray, top_k: int) -> tuple:
+        """Exact top-k of pre-scored rows as (rows, scores), best first."""
+        if len(rows) > top_k:
+            keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
+
+    def _own_index(self):
+        """Copy a memory-mapped snapshot index into private memory before its first write."""
+        if not self._mapped:
+            return
+        if self.quantization == "binary":
+            self.index = faiss.deserialize_index_binary(faiss.serialize_index_binary(self.index))
+        else:
+            self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+        self.index.hnsw.efSearch = HNSW_EF_SEARCH
+        self._mapped = False
+
+    def _index_add(self, vectors: np.ndarray):
+        if len(vectors) == 0:
+            return
+        self._own_index()
+        if self.quantization == "binary":
+            self.index.add(binary_codes(vectors))
+        else:
+            self.index.add(vectors)
+        if not self._owns_matrix:
+            self.embeddings = _flat_view(self.index)
+
+    def _index_search(self, query: np.ndarray, k: int, mask: np.ndarray = None):
+        """Search the HNSW graph; mask (bool per row) restricts the candidates."""
+        if self.quantization == "binary":
+            codes = binary_codes(query)
+            k = min(k, self.index.ntotal)
+            if mask is None:
+                distances, rows = self.index.search(codes, k)
+            else:
+                # Over-fetch and drop masked rows
+                fetch = min(self.index.ntotal, k * BINARY_FILTER_OVERFETCH)
+                distances, rows = self.index.search(codes, fetch)
+                keep = (rows[0] >= 0) & mask[np.maximum(rows[0], 0)]
+                distances, rows = distances[:, keep][:, :k], rows[:, keep][:, :k]
+            return EMBEDDING_DIM - 2 * distances.astype(np.float32), rows  # hamming → similarity
+
+        if mask is None:
+            return self.index.search(query, k)
+        bitmap = np.packbits(mask, bitorder="little")
+        params = faiss.SearchParametersHNSW(
+            sel=faiss.IDSelectorBitmap(self.size, faiss.swig_ptr(bitmap)),
+            efSearch=max(HNSW_EF_SEARCH, k),
+        )
+        return self.index.search(query, k, params=params)
+
+    def _vector_rows(self, query: np.ndarray, top_k: int, allowed_ids=None) -> tuple:
+        """(rows, cosine scores) of the best vector matches for a normalised query."""
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        if self.index.ntotal == 0 or top_k <= 0:
+            return empty
+
+        mask = None if not self.dead else self.alive[:self.size]
+        if allowed_ids is not None:
+            rows = self.rows_for(allowed_ids)
+            if len(rows) == 0:
+                return empty
+            if len(rows) <= EXACT_SEARCH_MAX_ROWS:
+                return self._top_k(rows, self.embeddings[rows] @ query[0], top_k)
+            mask = np.zeros(self.size, dtype=bool)
+            mask[rows] = True
+
+        rerank = self.quantization != "none"
+        k = min(max(top_k, RERANK_CANDIDATES) if rerank else top_k, self.index.ntotal)
+        scores, rows = self._index_search(query, k, mask)
+        keep = rows[0] >= 0
+        rows, scores = rows[0][keep], scores[0][keep]
+
+        if rerank:
+            # Second stage: full-precision rescoring of the coarse candidates
+            return self._top_k(rows, self.embeddings[rows] @ query[0], top_k)
+        return rows, scores
+
+    def _keyword_rows(self, query_text: str, top_k: int, allowed_ids=None) -> tuple:
+        """(rows, BM25 scores) of the best keyword matches."""
+        scores = self.bm25.scores(query_text)[:self.size]
+        if allowed_ids is not None:
+            rows = self.rows_for(allowed_ids)
+        else:
+            rows = np.flatnonzero(self.alive[:self.size])
+        scores = scores[rows]
+        keep = scores > 0
+        return self._top_k(rows[keep], scores[keep], top_k)
+
+    @_locked
+    def search(self, query_emb, top_k: int = 5, allowed_ids=None) -> list:
+        """
+        Nearest-neighbour search over the cached chunks.
+        Returns chunk dicts (with a cosine "score") best match first.
+
+        If allowed_ids is given, the search is restricted to those chunk ids
+        *before* top-k selection: small allowed sets are scored exactly against
+        their matrix rows, larger ones run HNSW with a row bitmap filter.
+        """
+        rows, scores = self._vector_rows(_normalize(query_emb), top_k, allowed_ids)
+        return [self._result(row, score) for row, score in zip(rows, scores)]
+
+    @_locked
+    def keyword_search(self, query_text: str, top_k: int = 5, allowed_ids=None) -> list:
+        """BM25 search over cached chunk text."""
+        rows, scores = self._keyword_rows(query_text, top_k, allowed_ids)
+        return [self._result(row, score) for row, score in zip(rows, scores)]
+
+    @_locked
+    def hybrid_search(self, query_text: str, query_emb, top_k: int = 5, allowed_ids=None) -> list:
+        """
+        BM25 + vector search fused with reciprocal-rank fusion in one pass.
+        "score" is the fused RRF score scaled to 0–1 (1 = ranked first by both).
+        """
+        candidates = max(top_k * 4, 20)
+        vector_rows, _ = self._vector_rows(_normalize(query_emb), candidates, allowed_ids)
+        keyword_rows, _ = self._keyword_rows(query_text, candidates, allowed_ids)
+
+        fused = {}
+        for ranked in (vector_rows, keyword_rows):
+            for rank, row in enumerate(ranked):
+                fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        best_possible = 2.0 / (RRF_K + 1)
+        best = heapq.nlargest(top_k, fused.items(), key=lambda item: item[1])
+        return [self._result(row, score / best_possible) for row, score in best]
+
 
 # ====================================================
 # Create all KB caches
@@ -113,3 +1105,31 @@ async def reload_all_kbs():
     for kb in knowledge_bases.values():
         await kb.load_data(force=True)
     print("🔁 All knowledge bases reloaded successfully.")
+
+
+def preload_kbs():
+    """Start background loads of all knowledge bases (e.g. at app startup)."""
+    for kb in knowledge_bases.values():
+        kb.ensure_loading()
+
+
+async def snapshot_all_kbs():
+    """Write on-disk snapshots of all loaded knowledge bases (e.g. at shutdown)."""
+    for kb in knowledge_bases.values():
+        await kb.save_snapshot()
+
+
+async def sync_all_kbs():
+    """Delta-sync the loaded knowledge bases that are not tailing a change stream."""
+    for kb in knowledge_bases.values():
+        if kb.ready and kb._watch_task is None:
+            await kb.sync()
+
+
+async def sync_kbs_forever(interval: int = SYNC_INTERVAL_SECONDS):
+    """Delta-sync the loaded knowledge bases every `interval` seconds."""
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        await sync_all_kbs()
@@ -5,7 +5,9 @@
 # ============================================
 
 
-from app.core.retriever_cache import embedder
+from app.core.retriever_cache import embedding_cache
+from app.core.embedding_codec import encode_embedding
+from app.core.conversation_memory import conversation_memory_index
 from datetime import datetime
 from bson import ObjectId
 from app.config.db import db, get_collection
@@ -179,11 +181,14 @@ async def _save_conversation(
             )
 
         
-        embedding = embedder.encode(f"{query} {answer}").astype("float32").tolist()
+        embedding = await embedding_cache.aencode(f"{query} {answer}")
         await conversation_collection.update_one(
             {"_id": conversation_result.inserted_id},
-            {"$set": {"embedding": embedding, "user_id": user_id}}
+            {"$set": {"embedding": encode_embedding(embedding), "user_id": user_id}}
         )
+        # Keep the user's in-memory conversation index current (same filter as memory retrieval)
+        if answer and domain:
+            conversation_memory_index.append(user_id, domain, conversation_result.inserted_id, embedding)
         
         return {
             "chat_id": chat_id,
@@ -4,35 +4,78 @@
 
 from app.models.chunk_document import ChunkDocumentModel
 from pymongo import MongoClient
+from pymongo.operations import SearchIndexModel
 import os
 from datetime import datetime
 import numpy as np
 from dotenv import load_dotenv
 from bson import ObjectId
-from app.config.db import db, get_collection
+from app.config.db import db, get_sync_db
+from app.core.embedding_codec import encode_embedding
+from app.core.retriever_cache import knowledge_bases, EMBEDDING_DIM
 
 load_dotenv()
 
 # ====================================================
-# Index Setup (called on startup)
+# Atlas Vector Search index (used by retrieve_similar)
+# "_id" is a filter field so the ACL is applied inside $vectorSearch
+# ====================================================
+VECTOR_INDEX_NAME = "vector_index"
+VECTOR_INDEX_DEFINITION = {
+    "fields": [
+        {
+            "type": "vector",
+            "path": "embedding",
+            "numDimensions": EMBEDDING_DIM,
+            "similarity": "cosine",
+        },
+        {"type": "filter", "path": "_id"},
+    ]
+}
+
+
+def _has_vector_fields(definition: dict) -> bool:
+    """True if an index definition already contains every field of ours."""
+    fields = definition.get("fields", [])
+    return all(
+        any(all(field.get(k) == v for k, v in wanted.items()) for field in fields)
+        for wanted in VECTOR_INDEX_DEFINITION["fields"]
+    )
+
+
+def ensure_vector_search_index(col):
+    """Create vector_index on a KB collection, or update it in place if it lacks our fields."""
+    existing = next(iter(col.list_search_indexes(VECTOR_INDEX_NAME)), None)
+    if existing is None:
+        col.create_search_index(
+            SearchIndexModel(
+                definition=VECTOR_INDEX_DEFINITION,
+                name=VECTOR_INDEX_NAME,
+                type="vectorSearch",
+            )
+        )
+        print(f"✅ Atlas vector search index created for: {col.name}")
+    elif not _has_vector_fields(existing.get("latestDefinition", {})):
+        # Atlas rebuilds the index in the background; queries keep using the old one meanwhile
+        col.update_search_index(VECTOR_INDEX_NAME, VECTOR_INDEX_DEFINITION)
+        print(f"🔄 Atlas vector search index updated for: {col.name}")
+    else:
+        print(f"✅ Atlas vector search index up to date for: {col.name}")
+
+
+# ====================================================
+# Index Setup (called on startup from config.db.ensure_indexes)
 # ====================================================
 def setup_mongo_indexes():
-    """Create all necessary indexes (vector + text)"""
+    """Create or update all necessary indexes (vector search + text). Blocking: run off the event loop."""
+    db = get_sync_db()
 
-    # --- 1. Knowledge Base vector indexes ---
-    vector_collections = ["kb_general", "kb_coaching", "kb_student"]
-    for name in vector_collections:
-        col = db[name]
+    # --- 1. Atlas Vector Search indexes with ACL filter field ---
+    for name in ["kb_general", "kb_coaching", "kb_student", "kb_teacher"]:
         try:
-            # Vector index (for Atlas Vector Search or compatible)
-            col.create_index(
-                [("embedding", "vector")],
-                name="embedding_vector_index",
-                default_language="none"
-            )
-            print(f"✅ Vector index ensured for: {name}")
+            ensure_vector_search_index(db[name])
         except Exception as e:
-            print(f"⚠️ Could not create vector index for {name}: {e}")
+            print(f"⚠️ Could not ensure Atlas vector search index for {name}: {e}")
 
     # --- 2. Conversation text search index ---
     try:
@@ -46,6 +89,13 @@ def setup_mongo_indexes():
     except Exception as e:
         print(f"⚠️ Failed to create text index for conversations: {e}")
 
+    # --- 3. Prompt cache LRU index (eviction sorts by last use) ---
+    try:
+        db["llm_prompt_cache"].create_index([("last_used_at", 1)], name="prompt_cache_lru_index")
+        print("✅ LRU index created for 'llm_prompt_cache' collection.")
+    except Exception as e:
+        print(f"⚠️ Failed to create prompt cache index: {e}")
+
 # ====================================================
 # Store Document Embeddings
 # ====================================================
@@ -58,7 +108,7 @@ def store_embeddings(chunks, embeddings, source_type="student", metadata: dict |
     """
 
     # Validate inputs
-    if not chunks or not embeddings:
+    if not chunks or len(embeddings) == 0:
         raise ValueError("Chunks and embeddings cannot be empty.")
 
     # Ensure numpy arrays
@@ -85,9 +135,9 @@ def store_embeddings(chunks, embeddings, source_type="student", metadata: dict |
             _id=doc_id,
             filename=filename or f"chunk_{i}_{now.isoformat()}.txt",
             chunk_text=chunk,
-            embedding=emb.tolist(),
             created_at=now
         ).dict(by_alias=True)
+        doc["embedding"] = encode_embedding(emb)
         docs.append(doc)
     print("docs")
     # Insert into MongoDB
@@ -99,29 +149,11 @@ def store_embeddings(chunks, embeddings, source_type="student", metadata: dict |
         print(f"❌ MongoDB insert failed: {e}")
         return
 
-    return docs
-
-# ====================================================
-# Load Stored Embeddings (Optional)
-# ====================================================
-
-def load_embeddings(source_type="student"):
-    """
-    Loads embeddings and texts from MongoDB for a given source.
-    Returns (texts, np.array(embeddings))
-    """
-    collection_name = f"kb_{source_type}"
-    collection = get_collection(collection_name)
-    records = list(collection.find({}, {"_id": 0, "chunk_text": 1, "embedding": 1}))
-
-    if not records:
-        print(f"⚠️ No records found in {collection_name}.")
-        return [], np.array([])
-
-    texts = [r["chunk_text"] for r in records]
-    embs = np.array([r["embedding"] for r in records], dtype=np.float32)
-    return texts, embs
+    # Keep the in-process ANN index in step with MongoDB
+    if source_type in knowledge_bases:
+        knowledge_bases[source_type].add_documents(docs)
 
+    return docs
 
 # ====================================================
 # Load All Metadata (MongoDB)
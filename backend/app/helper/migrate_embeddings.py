@@ -0,0 +1,70 @@
+# ============================================
+# migrate_embeddings.py
+# Rewrites embeddings stored as arrays of doubles into BSON binary
+# vectors (see app/core/embedding_codec.py). Safe to re-run: only
+# documents still holding an array are touched.
+# Run: python -m app.helper.migrate_embeddings [--dry-run] [collection ...]
+# ============================================
+
+import sys
+import time
+import asyncio
+from pymongo import UpdateOne
+from app.core.embedding_codec import encode_embedding, decode_embedding, EMBEDDING_STORAGE_FORMAT
+
+# ============================
+# CONFIG
+# ============================
+
+DEFAULT_COLLECTIONS = ["kb_student", "kb_teacher", "kb_coaching", "kb_general", "conversations"]
+BATCH_SIZE = 1000
+
+# An array embedding has an element at index 0; a binary vector does not
+LEGACY_FILTER = {"embedding.0": {"$exists": True}}
+
+
+async def migrate_collection(db, name: str, dry_run: bool = False) -> int:
+    col = db[name]
+    pending = await col.count_documents(LEGACY_FILTER)
+    print(f"📦 {name}: {pending} embeddings to convert to {EMBEDDING_STORAGE_FORMAT}")
+    if dry_run or not pending:
+        return pending
+
+    started = time.perf_counter()
+    converted = 0
+    ops = []
+    cursor = col.find(LEGACY_FILTER, {"embedding": 1}, batch_size=BATCH_SIZE)
+    async for doc in cursor:
+        ops.append(UpdateOne(
+            # Match the array again so a concurrent rewrite is not clobbered
+            {"_id": doc["_id"], "embedding.0": {"$exists": True}},
+            {"$set": {"embedding": encode_embedding(decode_embedding(doc["embedding"]))}},
+        ))
+        if len(ops) >= BATCH_SIZE:
+            await col.bulk_write(ops, ordered=False)
+            converted += len(ops)
+            ops = []
+            print(f"   ⏳ {converted}/{pending}")
+    if ops:
+        await col.bulk_write(ops, ordered=False)
+        converted += len(ops)
+
+    print(f"✅ {name}: converted {converted} embeddings in {time.perf_counter() - started:.1f}s")
+    return converted
+
+
+async def main(argv: list):
+    # app.config.db schedules index creation on import, so it needs the running loop
+    from app.config.db import db
+
+    dry_run = "--dry-run" in argv
+    collections = [a for a in argv if not a.startswith("--")] or DEFAULT_COLLECTIONS
+    if EMBEDDING_STORAGE_FORMAT == "list":
+        print("⚠️ EMBEDDING_STORAGE_FORMAT=list: nothing to migrate.")
+        return
+    for name in collections:
+        await migrate_collection(db, name, dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -28,6 +28,34 @@ gemini_client = genai.Client(api_key=GEMINI_API_KEY)
 # ------------------------------------------------
 # Core LLM handler
 # ------------------------------------------------
+def _gemini_request(prompt: str, response_format: Optional[Dict] = None) -> Dict:
+    """generate_content arguments shared by call_gemini and acall_gemini."""
+    if response_format:
+        config = types.GenerateContentConfig(
+            system_instruction=SYSTEM_PROMPT,
+            response_mime_type="application/json",
+            responseSchema=response_format
+        )
+    else:
+        config = types.GenerateContentConfig(
+            system_instruction=SYSTEM_PROMPT,
+            # response_mime_type="application/json",
+        )
+    return {
+        "model": GEMINI_MODEL,
+        "contents": [
+            {
+                "parts": [
+                    {
+                        "text": prompt
+                    }
+                ]
+            }
+        ],
+        "config": config,
+    }
+
+
 def call_gemini(prompt: str, response_format: Optional[Dict] = None) -> str:
     """
     Unified function to route query based on availability:
@@ -39,47 +67,33 @@ def call_gemini(prompt: str, response_format: Optional[Dict] = None) -> str:
     # =======================
     try:
         logger.info(f"⚙️ Running Gemini model: {GEMINI_MODEL}")
-
-        if response_format:
-        
-            response = gemini_client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=[
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=SYSTEM_PROMPT,
-                    response_mime_type="application/json",
-                    responseSchema=response_format
-                )
-            )
-        else:
-            response = gemini_client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=[
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=SYSTEM_PROMPT,
-                    # response_mime_type="application/json",
-                ),
-            )
+        response = gemini_client.models.generate_content(**_gemini_request(prompt, response_format))
         print(response.text, "--------:::::::::::::::: response gemini")
         return response.text.strip()
     except Exception as e:
         logger.warning(f"⚠️ Gemini failed: {e}")
+
+
+async def acall_gemini(prompt: str, response_format: Optional[Dict] = None) -> str:
+    """Async call_gemini on the client's async (aio) interface, which keeps its own session."""
+    try:
+        logger.info(f"⚙️ Running Gemini model (async): {GEMINI_MODEL}")
+        response = await gemini_client.aio.models.generate_content(**_gemini_request(prompt, response_format))
+        return response.text.strip()
+    except Exception as e:
+        logger.warning(f"⚠️ Gemini failed: {e}")
+
+
+async def astream_gemini(prompt: str):
+    """Yield answer text as Gemini streams it."""
+    try:
+        logger.info(f"⚙️ Streaming Gemini model: {GEMINI_MODEL}")
+        stream = await gemini_client.aio.models.generate_content_stream(**_gemini_request(prompt))
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        logger.warning(f"⚠️ Gemini stream failed: {e}")
     
     
 
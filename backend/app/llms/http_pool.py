@@ -0,0 +1,27 @@
+# ============================================
+# http_pool.py
+# Shared pooled HTTP client for the async LLM clients
+# (keep-alive connections are reused across requests)
+# ============================================
+
+import os
+import httpx
+from dotenv import load_dotenv
+
+# ------------------------------------------------
+# Load configuration
+# ------------------------------------------------
+load_dotenv()
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))  # seconds, per request
+
+# One pool per process; httpx keeps separate connections per host
+llm_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+    ),
+    timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0),
+)
@@ -8,7 +8,8 @@ import os
 from app.prompt.system_prompt import SYSTEM_PROMPT as system_prompt
 from dotenv import load_dotenv
 import logging
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from app.llms.http_pool import llm_http_client
 
 # ------------------------------------------------
 # Load configuration
@@ -25,6 +26,11 @@ hf_client = OpenAI(
     base_url="https://router.huggingface.co/v1",
     api_key=HF_TOKEN
 )
+async_hf_client = AsyncOpenAI(
+    base_url="https://router.huggingface.co/v1",
+    api_key=HF_TOKEN,
+    http_client=llm_http_client,
+)
 
 # ------------------------------------------------
 # Core LLM handler
@@ -57,6 +63,47 @@ def call_huggingface(prompt: str) -> str:
         logger.warning(f"⚠️ Hugging Face failed: {e}")
 
 
+async def acall_huggingface(prompt: str) -> str:
+    """Async call_huggingface on the pooled async client."""
+    try:
+        logger.info(f"⚙️ Running Hugging Face model (async): {HF_MODEL}")
+
+        response = await async_hf_client.chat.completions.create(
+            model=HF_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            max_completion_tokens=8000,
+        )
+        return response.choices[0].message.content.strip()
+
+    except Exception as e:
+        logger.warning(f"⚠️ Hugging Face failed: {e}")
+
+
+
+async def astream_huggingface(prompt: str):
+    """Yield answer tokens as the Hugging Face router streams them."""
+    try:
+        logger.info(f"⚙️ Streaming Hugging Face model: {HF_MODEL}")
+
+        stream = await async_hf_client.chat.completions.create(
+            model=HF_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            max_completion_tokens=8000,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    except Exception as e:
+        logger.warning(f"⚠️ Hugging Face stream failed: {e}")
+
    
 def call_huggingface_multimodal(messages: list) -> str:
     """
@@ -5,6 +5,7 @@
 # ============================================
 
 import os
+import asyncio
 import subprocess
 from dotenv import load_dotenv
 import logging
@@ -47,6 +48,25 @@ def call_ollama(prompt: str, model: str = OLLAMA_MODEL) -> str:
         raise
 
 
+async def acall_ollama(prompt: str, model: str = OLLAMA_MODEL) -> str:
+    """Run prompt via the Ollama CLI without blocking the event loop."""
+    try:
+        logger.info(f"🦙 Running Ollama model (async): {model}")
+        proc = await asyncio.create_subprocess_exec(
+            "ollama", "run", model,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise RuntimeError("Ollama not installed.")
+    stdout, stderr = await proc.communicate(prompt.encode("utf-8"))
+    if proc.returncode != 0:
+        logger.error(f"Ollama inference failed: {stderr.decode().strip()}")
+        raise RuntimeError(f"Ollama exited with code {proc.returncode}")
+    return stdout.decode().strip()
+
+
    
 def call_ollama_multimodal(messages: list) -> str:
     """
@@ -9,7 +9,8 @@ from app.prompt.system_prompt import SYSTEM_PROMPT as system_prompt
 
 from transformers import AutoTokenizer, AutoModelForCausalLM
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from app.llms.http_pool import llm_http_client
 import logging
 from google import genai
 from google.genai import types
@@ -25,6 +26,7 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5-nano")
 
 open_ai_client = OpenAI(api_key=OPENAI_API_KEY)
+async_open_ai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=llm_http_client)
 
 
 # ------------------------------------------------
@@ -56,6 +58,45 @@ def call_openai(prompt: str) -> str:
         logger.warning(f"⚠️ OpenAI failed: {e}")
 
 
+async def acall_openai(prompt: str) -> str:
+    """Async call_openai: awaits the pooled async client instead of blocking."""
+    try:
+        logger.info(f"⚙️ Running OpenAI model (async): {OPENAI_MODEL}")
+
+        response = await async_open_ai_client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            max_completion_tokens=8000,
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        logger.warning(f"⚠️ OpenAI failed: {e}")
+
+
+async def astream_openai(prompt: str):
+    """Yield answer tokens as OpenAI streams them."""
+    try:
+        logger.info(f"⚙️ Streaming OpenAI model: {OPENAI_MODEL}")
+
+        stream = await async_open_ai_client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            max_completion_tokens=8000,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        logger.warning(f"⚠️ OpenAI stream failed: {e}")
+
+
 
 def call_openai_multimodal(messages: list) -> str:
     """
@@ -1,9 +1,13 @@
+import asyncio
 from app.core.logger_middleware import LoggerMiddleware
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers import auth, aws, status, upload, converstions, coaching, teachers, students, query_lang, notes, knowledge_graph, speech, sheepmate
 
+from app.core.retriever import RETRIEVAL_MODE
+from app.core.retriever_cache import preload_kbs, sync_kbs_forever, snapshot_all_kbs
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -38,6 +42,22 @@ app.include_router(sheepmate.router, prefix="/sheepmate", tags=["Sheepmate"])
 
 
 
+@app.on_event("startup")
+async def preload_knowledge_bases():
+  # Hybrid retrieval searches the in-process KBs on every query: load them up front
+  if RETRIEVAL_MODE == "hybrid":
+    preload_kbs()
+  # Keep loaded KBs current with uploads made through other workers
+  app.state.kb_sync_task = asyncio.create_task(sync_kbs_forever())
+
+
+@app.on_event("shutdown")
+async def snapshot_knowledge_bases():
+  app.state.kb_sync_task.cancel()
+  # The next start restores from disk and only delta-syncs
+  await snapshot_all_kbs()
+
+
 @app.get("/")
 def root():
   return {
@@ -1,11 +1,12 @@
-from typing import List, Optional, Dict, Any
+import asyncio
+from typing import List, Optional, Dict, Any, AsyncIterator
 from app.mylanggraph.nodes.save_conversation_node import node_save_conversation
 from langgraph.graph import StateGraph, END
 from app.mylanggraph.mystate import AssistantState
 from app.mylanggraph.nodes.ambiguity_node import ambiguity_node
 from app.mylanggraph.nodes.parallel_retrieval_node import parallel_retrieval_node
 from app.mylanggraph.nodes.final_answer_node import final_answer_node
-from app.mylanggraph.nodes.final_answer_node import final_answer_node
+from app.mylanggraph.nodes.final_answer_node import stream_final_answer
 
 def build_graph():
     g = StateGraph(AssistantState)
@@ -29,6 +30,27 @@ def build_graph():
 my_graph_workflow = build_graph()
 
 
+def build_prepare_graph():
+    """Graph up to (not including) the answer: used by the streaming pipeline."""
+    g = StateGraph(AssistantState)
+
+    g.add_node("ambiguity", ambiguity_node)
+    g.add_node("parallel_retrieval", parallel_retrieval_node)
+
+    g.set_entry_point("ambiguity")
+
+    g.add_edge("ambiguity", "parallel_retrieval")
+    g.add_edge("parallel_retrieval", END)
+
+    return g.compile()
+
+
+my_prepare_workflow = build_prepare_graph()
+
+# Producer tasks of in-flight streams (kept referenced until they finish)
+_stream_tasks = set()
+
+
 
 
 
@@ -129,3 +151,75 @@ async def process_query_with_lang_graph(
             "error": f"Failed to process query: {str(e)}"
         }
 
+
+async def stream_query_with_lang_graph(
+    query: str,
+    user_id: str,
+    teacher_id: Optional[str] = None,
+    student_id: Optional[str] = None,
+    domain: Optional[str] = None,
+    chat_id: Optional[str] = None,
+    previous_conversation: Optional[str] = None,
+    chat_space: Optional[str] = None,
+    transcription: Optional[str] = None,
+    s3_url: Optional[str] = None,
+    to_reply: Optional[str] = None,
+    selected_document_transcript: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of process_query_with_lang_graph.
+    Yields {"event": "token", "data": str} while the answer is generated,
+    then one {"event": "done", "data": {...}} once it has been saved.
+    Generation and saving run in their own task, so the conversation is
+    still persisted if the client disconnects mid-stream.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            state = initial_state(
+                query=query,
+                user_id=user_id,
+                teacher_id=teacher_id,
+                student_id=student_id,
+                domain=domain,
+                chat_id=chat_id,
+                previous_conversation=previous_conversation,
+                image_url=s3_url,
+                chat_space=chat_space,
+                image_transcript=transcription,
+                to_reply=to_reply,
+                selected_document_transcript=selected_document_transcript
+            )
+            state = await my_prepare_workflow.ainvoke(state)
+
+            async for token in stream_final_answer(state):
+                await events.put({"event": "token", "data": token})
+
+            state = await node_save_conversation(state)
+            result = state.get("response_data") or {}
+            await events.put({
+                "event": "done",
+                "data": {
+                    "answer": state.get("answer", ""),
+                    "sources": result.get("sources", []),
+                    "chat_id": result.get("chat_id"),
+                    "conversation_id": result.get("conversation_id"),
+                    "error": state.get("error"),
+                },
+            })
+        except Exception as e:
+            print(f"Error in stream_query: {str(e)}")
+            await events.put({"event": "error", "data": f"Failed to process query: {str(e)}"})
+        finally:
+            await events.put(None)
+
+    task = asyncio.create_task(produce())
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+
+    while True:
+        event = await events.get()
+        if event is None:
+            break
+        yield event
@@ -1,5 +1,5 @@
 from typing import Dict, Any
-from app.core.llm_manager import call_llm
+from app.core.llm_manager import acall_llm
 from app.data.syllabus_data import get_syllabus_context
 from app.models.student_knowledge import StudentKnowledgeGraph
 from app.config.db import get_collection
@@ -83,7 +83,7 @@ async def chat_to_concept_node(state: Dict[str, Any]) -> Dict[str, Any]:
         # 3. Call LLM
         # Using a lower temperature for deterministic classification
         LLM_MODE = "huggingface"
-        response_text = call_llm(prompt, LLM_MODE)
+        response_text = await acall_llm(prompt, LLM_MODE)
         # Clean response to ensure JSON
         response_text = response_text.replace("```json", "").replace("```", "").strip()
         classification = json.loads(response_text)
@@ -1,3 +1,5 @@
+import hashlib
+
 from app.prompt.answer_prompt import ANSWER_PROMPT as FINAL_PROMPT
 from app.prompt.system_prompt import SYSTEM_PROMPT as SYS
 from app.prompt.domain_prompt import DOMAIN_PROMPT as DP
@@ -7,7 +9,9 @@ from app.prompt.memory_prompt import MEMORY_PROMPT as CP
 from app.prompt.document_prompt import DOCUMENT_PROMPT as DP
 from app.prompt.user_prompt import USER_PROMPT as UP
 
-from app.core.llm_manager import call_llm
+from app.core.llm_manager import acall_llm, astream_llm
+from app.core.answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from app.core.retriever_cache import embedding_cache
 
 
 # ==== HELPER: Generate clarification prompt ====
@@ -34,7 +38,8 @@ def generate_clarification_prompt(state):
     return "I'm not quite sure what you mean. Could you provide more details?"
 
 
-def final_answer_node(state):
+def build_final_prompt(state) -> str:
+    """Assemble the answer prompt from retrieved notes, memory and the query."""
 
     # previous conversation
     last_conversation: str = None
@@ -88,8 +93,60 @@ def final_answer_node(state):
     with open('final_answer_node.txt', 'w', encoding='utf-8') as file:
         file.write(prompt)
 
+    return prompt
+
+
+# ==== HELPER: Semantic answer cache ====
+def _answer_cache_context(state):
+    """
+    (scope, retrieved chunks) when the answer may be shared with
+    near-identical questions, else None: attachments, a viewed document, a
+    reply or conversation memory make the question personal.
+    The scope is the teacher (or the user without one), plus the asking
+    user when their own notes are among the chunks; invalidate() by any
+    document owner drops the entries built from their notes.
+    """
+    if not ANSWER_CACHE_ENABLED or state["directive"] != "NORMAL" or not state["kb_chunks"]:
+        return None
+    if state["image_transcript"] or state["selected_document_transcript"] or state["to_reply"]:
+        return None
+    if state["memory_chunks"] or state["last_conversation"]:
+        return None
+
+    owners = {state["teacher_id"] or state["user_id"]}
+    context = [f"domain:{state['domain']}"]
+    for c in state["kb_chunks"]:
+        source_id = str(c["source_id"])
+        role = ("s" if source_id in state["student_docs"] else "") + ("t" if source_id in state["teacher_docs"] else "")
+        if "s" in role:
+            owners.add(state["user_id"])
+        # The text hash tells re-transcribed versions of the same document apart
+        context.append(f"{role}:{source_id}:{hashlib.sha1(c['text'].encode('utf-8')).hexdigest()}")
+    return tuple(sorted(str(o) for o in owners if o)), context
+
+async def _cached_answer(state):
+    """Returns (cache context, query embedding, cached answer or None)."""
+    context = _answer_cache_context(state)
+    if context is None:
+        return None, None, None
+    # Already embedded (and cached) during retrieval
+    query_emb = await embedding_cache.aencode(state["query"])
+    return context, query_emb, answer_cache.get(*context, query_emb)
+
+
+async def final_answer_node(state):
+    context, query_emb, cached = await _cached_answer(state)
+    if cached is not None:
+        print("⚡ Answer served from semantic cache")
+        state["answer"] = cached
+        return state
+
+    prompt = build_final_prompt(state)
+
     if state["directive"] == "NORMAL":
-        state["answer"] = call_llm(prompt)
+        state["answer"] = await acall_llm(prompt)
+        if context is not None:
+            answer_cache.put(*context, query_emb, state["answer"])
     else:
         state["answer"] = generate_clarification_prompt(state)
 
@@ -98,3 +155,27 @@ def final_answer_node(state):
     return state
 
 
+async def stream_final_answer(state):
+    """
+    Streaming final_answer_node: yields the answer as the LLM generates it
+    and leaves the full text in state["answer"] once the stream ends.
+    """
+    if state["directive"] != "NORMAL":
+        state["answer"] = generate_clarification_prompt(state)
+        yield state["answer"]
+        return
+
+    context, query_emb, cached = await _cached_answer(state)
+    if cached is not None:
+        print("⚡ Answer served from semantic cache")
+        state["answer"] = cached
+        yield cached
+        return
+
+    parts = []
+    async for token in astream_llm(build_final_prompt(state)):
+        parts.append(token)
+        yield token
+    state["answer"] = "".join(parts).strip()
+    if context is not None:
+        answer_cache.put(*context, query_emb, state["answer"])
@@ -1,28 +1,24 @@
 from app.core.retriever import retrieve_similar
 from bson import ObjectId
 
-from app.config.db import get_collection
+from app.core.retrieval_scope import retrieval_scope
 from app.core.save_conversation import _sanitize_sources
 
 async def retrieve_node(state):
     try:
         user_ids = [state["user_id"]]
         print(state["teacher_id"], state["student_id"])
-        student_user = await get_collection("students").find_one(
-            {"user_id": ObjectId(state["student_id"])}
-        )
-        print("student_user: ", student_user["user_id"])
-        teacher_user = await get_collection("teachers").find_one(
-            {"user_id": ObjectId(state["teacher_id"])}
-        )
-        print("teacher_user: ", teacher_user["user_id"])
+        # Profile lookups are cached by the retrieval scope service
+        has_student = await retrieval_scope.has_profile("students", state["student_id"])
+        has_teacher = await retrieval_scope.has_profile("teachers", state["teacher_id"])
+        teacher_user_id = state["teacher_id"] if has_teacher else None
         if state["student_id"] == state["user_id"]:
-            if teacher_user and "user_id" in teacher_user:
-                user_ids.append(str(teacher_user["user_id"]))
+            if has_teacher:
+                user_ids.append(state["teacher_id"])
 
         if state["teacher_id"] == state["user_id"]:
-            if student_user and "user_id" in student_user:
-                user_ids.append(str(student_user["user_id"]))
+            if has_student:
+                user_ids.append(state["student_id"])
 
         print("at retriever node USER IDS: ", user_ids)
         # for llm start
@@ -42,7 +38,7 @@ async def retrieve_node(state):
         state["student_docs"] = list(set(element for sublist in st_arr for element in sublist))
         print("sanitize_student_docs: ", len(sanitize_student_docs))
 
-        sanitize_teacher_docs = _sanitize_sources([doc for doc in user_docs if doc["user_id"] == str(teacher_user["user_id"])])
+        sanitize_teacher_docs = _sanitize_sources([doc for doc in user_docs if doc["user_id"] == teacher_user_id])
         tr_arr = []
         for doc in sanitize_teacher_docs:
             tr_arr.append(doc["chunk_docs_ids"])
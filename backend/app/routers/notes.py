@@ -1,7 +1,9 @@
-from app.llms.gemini import call_gemini
+from app.llms.gemini import acall_gemini, GEMINI_MODEL
 from app.core.retriever_cache import knowledge_bases
 from app.core.storage import store_embeddings
-from app.core.embeddings import generate_embeddings
+from app.core.retrieval_scope import retrieval_scope
+from app.core.answer_cache import answer_cache
+from app.core.embeddings import agenerate_embeddings_batch, centroid_embedding
 from app.core.chunker import chunk_text
 
 from app.prompt.generate_mcq_prompt import GENERATE_MCQ_PROMPT
@@ -18,10 +20,10 @@ from app.core.text_extractor import extract_text_with_llm
 from app.config.db import db
 from bson import ObjectId
 from typing import Optional, List, Dict
-from app.core.llm_manager import call_llm
+from app.core.llm_manager import acall_llm, llm_model_id
+from app.core.prompt_cache import prompt_cache, is_json_output
 import json
 
-from tqdm import tqdm
 import os
 
 router = APIRouter()
@@ -167,16 +169,15 @@ async def create_transcript_from_image(req: TranscriptRequest):
             if old_chunk_ids:
                 print(f"🗑️ Removing {len(old_chunk_ids)} old chunks from {collection_name}...")
                 await db[collection_name].delete_many({"_id": {"$in": old_chunk_ids}})
+                if source_type in knowledge_bases:
+                    knowledge_bases[source_type].remove_documents(old_chunk_ids)
             
             # 2. Chunk the new text
             chunks = chunk_text(new_chunk_text)
             if chunks:
                 # 3. Generate embeddings
                 print(f"⚙️ Generating embeddings for {len(chunks)} chunks...")
-                embeddings = []
-                for chunk in tqdm(chunks, desc="Embedding Batches"):
-                    emb = generate_embeddings(chunk)
-                    embeddings.append(emb)
+                embeddings = await agenerate_embeddings_batch(chunks)
                 
                 # 4. Store new embeddings
                 print("💾 Storing embeddings in MongoDB...")
@@ -185,15 +186,18 @@ async def create_transcript_from_image(req: TranscriptRequest):
                 
                 # Extract new IDs
                 new_chunk_ids = [doc["_id"] for doc in new_chunk_docs]
+                new_centroid = centroid_embedding(embeddings)
                 
-                # 5. Reload KB
+                # 5. Delta-sync KB (new chunks are already cached)
                 if source_type in knowledge_bases:
-                    await knowledge_bases[source_type].load_data(force=True)
-                    print(f"⚡ {source_type.capitalize()} knowledge base reloaded.")
+                    await knowledge_bases[source_type].sync()
+                    print(f"⚡ {source_type.capitalize()} knowledge base synced.")
             else:
                 new_chunk_ids = []
+                new_centroid = []
         else:
             new_chunk_ids = []
+            new_centroid = []
 
         # Update DB with new chunk_text and chunk_docs_ids
         await db.documents.update_one(
@@ -201,9 +205,12 @@ async def create_transcript_from_image(req: TranscriptRequest):
             {"$set": {
                 "notes_description": notes_description,
                 "chunk_text": new_chunk_text,
-                "chunk_docs_ids": new_chunk_ids
+                "chunk_docs_ids": new_chunk_ids,
+                "centroid_embedding": new_centroid
             }}
         )
+        retrieval_scope.invalidate(document.get("user_id"), *(document.get("shared_with") or []))
+        answer_cache.invalidate(document.get("user_id"), *(document.get("shared_with") or []))
         print(f"✅ Auto-saved transcription for page {req.page_number} to document {req.document_id}")
         
         return {
@@ -278,12 +285,9 @@ async def generate_notes(req: GenerateNotesRequest):
         """
         
         # Call LLM
-        # Run in executor to avoid blocking
-        loop = asyncio.get_running_loop()
-        generated_notes = await loop.run_in_executor(
-            None, 
-            call_llm, 
-            prompt
+        generated_notes = await prompt_cache.cached(
+            "generate-notes", llm_model_id(), [prompt],
+            lambda: acall_llm(prompt),
         )
         
         # ---------------------------------------------------------
@@ -376,12 +380,10 @@ async def generate_questions(req: QuestionGenerationRequest):
         document = await db.documents.find_one({"_id": document_id})
         
         # Call LLM
-        # Run in executor to avoid blocking
-        loop = asyncio.get_running_loop()
-        response_text = await loop.run_in_executor(
-            None, 
-            call_llm, 
-            prompt
+        response_text = await prompt_cache.cached(
+            "generate-questions", llm_model_id(), [prompt],
+            lambda: acall_llm(prompt),
+            accept=is_json_output,
         )
         
         # Parse JSON response
@@ -486,12 +488,10 @@ async def generate_mcq(req: MCQGenerationRequest):
         document = await db.documents.find_one({"_id": document_id})
         
         # Call LLM
-        # Run in executor to avoid blocking
-        loop = asyncio.get_running_loop()
-        response_text = await loop.run_in_executor(
-            None, 
-            call_llm, 
-            prompt
+        response_text = await prompt_cache.cached(
+            "generate-mcq", llm_model_id(), [prompt],
+            lambda: acall_llm(prompt),
+            accept=is_json_output,
         )
 
         # Parse JSON response
@@ -812,12 +812,10 @@ async def generate_mind_map(req: GenerateMindMapRequest):
         }
         
         # Call LLM
-        loop = asyncio.get_running_loop()
-        generated_mind_map = await loop.run_in_executor(
-            None, 
-            call_gemini, 
-            prompt,
-            response_format
+        generated_mind_map = await prompt_cache.cached(
+            "generate-mind-map", f"gemini:{GEMINI_MODEL}", [prompt, response_format],
+            lambda: acall_gemini(prompt, response_format),
+            accept=is_json_output,
         )
         
         # Clean response if it contains markdown formatting
@@ -1051,11 +1049,9 @@ async def generate_quick_notes_from_docs(req: QuickNotesRequest):
         """
         
         # Call LLM
-        loop = asyncio.get_running_loop()
-        quick_notes = await loop.run_in_executor(
-            None, 
-            call_llm, 
-            prompt
+        quick_notes = await prompt_cache.cached(
+            "quick-notes", llm_model_id(), [prompt],
+            lambda: acall_llm(prompt),
         )
         
         # Save quick notes to document
@@ -1172,11 +1168,10 @@ async def generate_quick_quiz_from_docs(req: QuickQuizRequest):
         """
         
         # Call LLM
-        loop = asyncio.get_running_loop()
-        response_text = await loop.run_in_executor(
-            None, 
-            call_llm, 
-            prompt
+        response_text = await prompt_cache.cached(
+            "quick-quiz", llm_model_id(), [prompt],
+            lambda: acall_llm(prompt),
+            accept=is_json_output,
         )
         
         # Parse JSON response
@@ -1319,11 +1314,10 @@ async def generate_quick_mcq_from_docs(req: QuickMCQRequest):
         """
         
         # Call LLM
-        loop = asyncio.get_running_loop()
-        response_text = await loop.run_in_executor(
-            None, 
-            call_llm, 
-            prompt
+        response_text = await prompt_cache.cached(
+            "quick-mcq", llm_model_id(), [prompt],
+            lambda: acall_llm(prompt),
+            accept=is_json_output,
         )
         
         # Parse JSON response
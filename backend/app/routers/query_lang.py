@@ -6,14 +6,16 @@
 from datetime import datetime
 from app.config.db import get_collection
 from typing import Optional
-from app.mylanggraph.mygraph import process_query_with_lang_graph
+from app.mylanggraph.mygraph import process_query_with_lang_graph, stream_query_with_lang_graph
 from app.core.text_extractor import extract_text_from_image_with_llm
 
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import requests
 import asyncio
+import json
 from bson import ObjectId
 
 # ====================================================
@@ -49,6 +51,93 @@ class QueryRequest(BaseModel):
 # Main RAG Query Endpoints
 # ====================================================
 
+async def _add_teacher_comment(req: QueryRequest) -> dict:
+    """A teacher replying inside a chat comments on the previous conversation."""
+    previous_conversation_id = ObjectId(req.previousConversation)
+
+    conversation_col = get_collection("conversations")
+    await conversation_col.update_one({
+        "_id": previous_conversation_id
+        }, {
+            "$push": {
+                "comments": {
+                    "user_id": req.userId,
+                    "comment_text": req.text,
+                    "in_reply_to": req.reply_context,
+                    "timestamp": datetime.utcnow()
+                }
+            }
+        })
+    
+    result = await conversation_col.find_one({
+        "_id": previous_conversation_id
+    }, {
+        "answer": 1,
+        "sources_used": 1,
+    })
+
+    return {
+        "answer": result.get("answer", ""),
+        "sources": result.get("sources_used", []),
+        "chat_id": req.chatId,
+        "conversation_id": req.previousConversation
+    }
+
+
+async def _transcribe_attachment(req: QueryRequest) -> Optional[str]:
+    """OCR the image attached to the query, if any."""
+    if not req.s3_url:
+        return None
+
+    print("s3 url present")
+    image_response = requests.get(req.s3_url, timeout=30)
+    if image_response.status_code != 200:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to fetch file from URL. Status: {image_response.status_code}"
+        )
+
+    contents = image_response.content
+    img_bytes = contents
+
+    # Run OCR in executor to avoid blocking
+    loop = asyncio.get_running_loop()
+    transcription = await loop.run_in_executor(
+        None, 
+        extract_text_from_image_with_llm, 
+        img_bytes
+    )
+    
+    if not transcription or transcription.strip() == "":
+        raise HTTPException(
+            status_code=400,
+            detail="Unable to extract text from the image."
+        )
+    return transcription
+
+
+def _graph_args(req: QueryRequest, transcription: Optional[str]) -> dict:
+    return dict(
+        query=req.text,
+        user_id=req.userId,
+        teacher_id=req.teacher_id,
+        student_id=req.student_id,
+        domain=req.domain_expertise,
+        chat_id=req.chatId,
+        previous_conversation=req.previousConversation,
+        s3_url=req.s3_url,
+        chat_space=req.chat_space,
+        transcription=transcription,
+        to_reply=req.reply_context,
+        selected_document_transcript=req.selected_document
+    )
+
+
+def _sse(event: str, data) -> str:
+    """One Server-Sent Event; data is JSON so newlines in tokens are safe."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
 @router.post("/query")
 async def query(req: QueryRequest):
     """
@@ -60,79 +149,11 @@ async def query(req: QueryRequest):
         
         if req.teacher_id == req.userId and req.chatId:
             print("teacher chat")
-            previous_conversation_id = ObjectId(req.previousConversation)
-
-            conversation_col = get_collection("conversations")
-            await conversation_col.update_one({
-                "_id": previous_conversation_id
-                }, {
-                    "$push": {
-                        "comments": {
-                            "user_id": req.userId,
-                            "comment_text": req.text,
-                            "in_reply_to": req.reply_context,
-                            "timestamp": datetime.utcnow()
-                        }
-                    }
-                })
-            
-            result = await conversation_col.find_one({
-                "_id": previous_conversation_id
-            }, {
-                "answer": 1,
-                "sources_used": 1,
-            })
-
-            return {
-                "answer": result.get("answer", ""),
-                "sources": result.get("sources_used", []),
-                "chat_id": req.chatId,
-                "conversation_id": req.previousConversation
-            }
-            
-        
-        transcription = None
-        if req.s3_url:
-
-            print("s3 url present")
-            image_response = requests.get(req.s3_url, timeout=30)
-            if image_response.status_code != 200:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Failed to fetch file from URL. Status: {image_response.status_code}"
-                )
-        
-            contents = image_response.content
-            img_bytes = contents
-
-            # Run OCR in executor to avoid blocking
-            loop = asyncio.get_running_loop()
-            transcription = await loop.run_in_executor(
-                None, 
-                extract_text_from_image_with_llm, 
-                img_bytes
-            )
-            
-            if not transcription or transcription.strip() == "":
-                raise HTTPException(
-                    status_code=400,
-                    detail="Unable to extract text from the image."
-                )
-
-        result = await process_query_with_lang_graph(
-            query=req.text,
-            user_id=req.userId,
-            teacher_id=req.teacher_id,
-            student_id=req.student_id,
-            domain=req.domain_expertise,
-            chat_id=req.chatId,
-            previous_conversation=req.previousConversation,
-            s3_url=req.s3_url,
-            chat_space=req.chat_space,
-            transcription=transcription,
-            to_reply=req.reply_context,
-            selected_document_transcript=req.selected_document
-        )
+            return await _add_teacher_comment(req)
+
+        transcription = await _transcribe_attachment(req)
+
+        result = await process_query_with_lang_graph(**_graph_args(req, transcription))
 
         # print(result, "::::: -> result here")
         return result["data"]
@@ -145,4 +166,34 @@ async def query(req: QueryRequest):
         }
 
 
-
+@router.post("/query/stream")
+async def query_stream(req: QueryRequest):
+    """
+    Streaming /query over Server-Sent Events: "token" events carry answer
+    text as it is generated, then a single "done" event carries the same
+    payload /query returns (answer, sources, chat_id, conversation_id).
+    """
+    print("stream request received", req)
+
+    async def events():
+        try:
+            if req.teacher_id == req.userId and req.chatId:
+                print("teacher chat")
+                yield _sse("done", await _add_teacher_comment(req))
+                return
+
+            transcription = await _transcribe_attachment(req)
+            async for event in stream_query_with_lang_graph(**_graph_args(req, transcription)):
+                yield _sse(event["event"], event["data"])
+        except HTTPException as e:
+            yield _sse("error", e.detail)
+        except Exception as e:
+            print(f"Error in query stream: {str(e)}")
+            yield _sse("error", f"Failed to process query: {str(e)}")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
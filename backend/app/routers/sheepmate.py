@@ -11,7 +11,7 @@ import io
 import base64
 from fastapi import APIRouter, HTTPException, status, UploadFile, File
 from fastapi.responses import StreamingResponse
-from app.llms.gemini import call_gemini
+from app.llms.gemini import acall_gemini
 
 
 
@@ -243,7 +243,7 @@ async def pdf_to_excel(request: GoogleAttachmentRequest):
                 """
                 # Truncating text to avoid generic context limit if necessary, though Gemini handles large context well.
                 
-                response_text = call_gemini(prompt)
+                response_text = await acall_gemini(prompt)
                 
                 print(response_text)
                 
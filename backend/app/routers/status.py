@@ -2,6 +2,11 @@
 from fastapi import APIRouter, Depends
 from pymongo import MongoClient
 from app.config.db import get_db
+from app.core.retriever_cache import embedding_cache, embedding_service, knowledge_bases
+from app.core.retrieval_scope import retrieval_scope
+from app.core.answer_cache import answer_cache
+from app.core.prompt_cache import prompt_cache
+from app.core.llm_router import llm_router
 from datetime import datetime
 
 router = APIRouter()
@@ -32,7 +37,16 @@ async def get_status():
             "status": "ok",
             "timestamp": datetime.utcnow().isoformat(),
             "collections": collections,
-            "last_updated": latest_doc.get("created_at").isoformat() if latest_doc else None
+            "last_updated": latest_doc.get("created_at").isoformat() if latest_doc else None,
+            "embedding_cache": embedding_cache.stats(),
+            "embedding_service": embedding_service.stats(),
+            "retrieval_scope": retrieval_scope.stats(),
+            "answer_cache": answer_cache.stats(),
+            "prompt_cache": prompt_cache.stats(),
+            "llm_router": llm_router.stats(),
+            "knowledge_bases": {
+                name: {"size": kb.size, **kb.load_stats} for name, kb in knowledge_bases.items()
+            }
         }
         
     except Exception as e:
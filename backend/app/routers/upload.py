@@ -8,12 +8,13 @@ from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import FileResponse
 from PyPDF2 import PdfReader
 from PIL import Image
-from tqdm import tqdm
 import io
 import os
 import asyncio
 from app.core.chunker import chunk_text
-from app.core.embeddings import generate_embeddings
+from app.core.retrieval_scope import retrieval_scope
+from app.core.answer_cache import answer_cache
+from app.core.embeddings import agenerate_embeddings_batch, centroid_embedding
 from app.core.storage import store_embeddings
 from app.core.retriever_cache import knowledge_bases
 from app.config.settings import UPLOAD_FOLDER
@@ -58,6 +59,7 @@ async def save_to_kb_db(
     shared_with: list,
     coaching_id: str
 ):
+    centroid = []
     if text and text != "":
         chunks = chunk_text(text)
         if not chunks:
@@ -65,19 +67,17 @@ async def save_to_kb_db(
 
         # Step 3: Generate embeddings
         print(f"⚙️ Generating embeddings for {len(chunks)} chunks...")
-        embeddings = []
-        for chunk in tqdm(chunks, desc="Embedding Batches"):
-            emb = generate_embeddings(chunk)
-            embeddings.append(emb)
+        embeddings = await agenerate_embeddings_batch(chunks)
 
         # Step 4: Store embeddings
         print("💾 Storing embeddings in MongoDB...")
         chunk_docs = store_embeddings(chunks, embeddings, source_type=source_type)
+        centroid = centroid_embedding(embeddings)
 
-        # Step 5: Reload relevant knowledge base
+        # Step 5: Delta-sync relevant knowledge base (new chunks are already cached)
         if source_type in knowledge_bases:
-            await knowledge_bases[source_type].load_data(force=True)
-            print(f"⚡ {source_type.capitalize()} knowledge base reloaded after upload.")
+            await knowledge_bases[source_type].sync()
+            print(f"⚡ {source_type.capitalize()} knowledge base synced after upload.")
 
     doc_id = ObjectId()  # Generate doc_id here to be available for return
 
@@ -104,13 +104,16 @@ async def save_to_kb_db(
                 "s3_url": s3_url,
                 # "chunk_docs_ids": [doc["_id"] for doc in chunk_docs],
                 "chunk_docs_ids": [],
+                "centroid_embedding": centroid,
                 "user_id": user_id,
                 "shared_with": shared_with,
                 "created_at": datetime.utcnow()
             }
 
-            col.insert_one(doc)
+            await col.insert_one(doc)
             logger.info(f"✅ Successfully saved document to MongoDB")
+            retrieval_scope.invalidate(user_id, *(shared_with or []))
+            answer_cache.invalidate(user_id, *(shared_with or []))
 
             try:
                 # Get the user's role
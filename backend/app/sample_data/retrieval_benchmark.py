@@ -0,0 +1,298 @@
+# ============================================
+# retrieval_benchmark.py
+# Offline latency / recall benchmark for the RAG retrieval path.
+# Seeds a local Mongo stand-in (mongomock-motor if installed, otherwise a
+# local mongod at BENCH_MONGO_URI) with synthetic kb_* chunks, documents
+# and conversations, then replays a query set through retrieve_similar and
+# retrieve_from_conversation_memory against brute-force ground truth.
+# Also measures recall of the quantised KB indexes (KB_QUANTIZATION).
+# Run: python -m app.sample_data.retrieval_benchmark
+# ============================================
+
+import os
+import io
+import time
+import asyncio
+import contextlib
+from datetime import datetime
+import numpy as np
+
+# ============================
+# CONFIG
+# ============================
+
+N_USERS = int(os.getenv("BENCH_USERS", "20"))
+DOCS_PER_USER = int(os.getenv("BENCH_DOCS_PER_USER", "10"))
+CHUNKS_PER_DOC = int(os.getenv("BENCH_CHUNKS_PER_DOC", "100"))
+CONVERSATIONS_PER_USER = int(os.getenv("BENCH_CONVERSATIONS", "200"))
+N_QUERIES = int(os.getenv("BENCH_QUERIES", "200"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "8"))
+N_CLUSTERS = 200            # topic structure, like chapters in a syllabus
+TOP_K = 5
+SEED = 7
+BENCH_MONGO_URI = os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=500")
+BENCH_DB = os.getenv("BENCH_DB", "ai_one_bench")
+QUANTIZATION_SUITE = os.getenv("BENCH_QUANTIZATION", "true").lower() == "true"
+
+# Never touch the real cluster or DATA_DIR; search the in-process KB
+# (Atlas $vectorSearch is not available offline).
+os.environ["MONGO_URI"] = BENCH_MONGO_URI
+os.environ.setdefault("RETRIEVAL_MODE", "hybrid")
+os.environ.setdefault("KB_SNAPSHOT", "false")
+os.environ.setdefault("RERANK_ENABLED", "false")
+
+KB_NAMES = ["student", "teacher", "coaching", "general"]
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def _report(name: str, latencies_ms: list, recalls: list, qps: float):
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    print(f"📌 {name:<22} recall@{TOP_K}={np.mean(recalls):.3f}  "
+          f"p50={p50:.2f}ms  p95={p95:.2f}ms  p99={p99:.2f}ms  throughput={qps:.1f} q/s")
+
+
+# ============================
+# SYNTHETIC CORPUS
+# ============================
+
+class SyntheticCorpus:
+    """Clustered unit vectors with matching bag-of-words text per cluster."""
+
+    def __init__(self, dim: int):
+        self.rng = np.random.default_rng(SEED)
+        self.dim = dim
+        self.centers = self.rng.normal(size=(N_CLUSTERS, dim)).astype(np.float32)
+        self.vocab = [[f"topic{c}term{j}" for j in range(20)] for c in range(N_CLUSTERS)]
+
+    def vectors(self, cluster: int, n: int) -> np.ndarray:
+        noise = 0.6 * self.rng.normal(size=(n, self.dim)).astype(np.float32)
+        return _unit(self.centers[cluster] + noise).astype(np.float32)
+
+    def text(self, cluster: int, words: int) -> str:
+        return " ".join(self.rng.choice(self.vocab[cluster], size=words))
+
+
+async def seed(bench_db, corpus: SyntheticCorpus, encode_embedding, centroid_embedding):
+    """Insert chunks, documents and conversations; returns ground-truth tables."""
+    from bson import ObjectId
+
+    now = datetime.utcnow()
+    users = [str(ObjectId()) for _ in range(N_USERS)]
+    chunks_by_user = {}      # user -> (chunk ids, unit matrix)
+    convs_by_user = {}       # user -> (conversation ids, unit matrix)
+    clusters_by_user = {}
+
+    for u, user_id in enumerate(users):
+        ids, mats, clusters = [], [], []
+        for d in range(DOCS_PER_USER):
+            cluster = int(corpus.rng.integers(N_CLUSTERS))
+            source = KB_NAMES[(u + d) % len(KB_NAMES)]
+            vecs = corpus.vectors(cluster, CHUNKS_PER_DOC)
+            chunk_docs = [
+                {
+                    "_id": ObjectId(),
+                    "filename": f"doc_{u}_{d}.pdf",
+                    "chunk_text": corpus.text(cluster, 40),
+                    "embedding": encode_embedding(v),
+                    "created_at": now,
+                }
+                for v in vecs
+            ]
+            await bench_db[f"kb_{source}"].insert_many(chunk_docs)
+            await bench_db["documents"].insert_one({
+                "_id": ObjectId(),
+                "filename": f"doc_{u}_{d}.pdf",
+                "source_type": source,
+                "chunk_text": " ".join(c["chunk_text"] for c in chunk_docs),
+                "chunk_docs_ids": [c["_id"] for c in chunk_docs],
+                "centroid_embedding": centroid_embedding(vecs),
+                "user_id": user_id,
+                "shared_with": [],
+                "created_at": now,
+            })
+            ids.extend(c["_id"] for c in chunk_docs)
+            mats.append(vecs)
+            clusters.append(cluster)
+        chunks_by_user[user_id] = (ids, np.vstack(mats))
+        clusters_by_user[user_id] = clusters
+
+        conv_vecs = np.vstack([corpus.vectors(c, 1) for c in corpus.rng.choice(clusters, CONVERSATIONS_PER_USER)])
+        conv_docs = [
+            {
+                "_id": ObjectId(),
+                "query": f"question {i}",
+                "answer": f"answer {i}",
+                "user_id": user_id,
+                "domain": "general",
+                "embedding": encode_embedding(v),
+                "created_at": now,
+            }
+            for i, v in enumerate(conv_vecs)
+        ]
+        await bench_db["conversations"].insert_many(conv_docs)
+        convs_by_user[user_id] = ([c["_id"] for c in conv_docs], conv_vecs)
+
+    return users, chunks_by_user, convs_by_user, clusters_by_user
+
+
+def make_queries(corpus: SyntheticCorpus, users: list, clusters_by_user: dict, embedding_cache) -> list:
+    """(user_id, text, vector) triples; vectors are pre-seeded into the query embedding cache."""
+    queries = []
+    for i in range(N_QUERIES):
+        user_id = users[i % len(users)]
+        cluster = int(corpus.rng.choice(clusters_by_user[user_id]))
+        text = f"{corpus.text(cluster, 6)} q{i}"
+        vec = corpus.vectors(cluster, 1)[0]
+        embedding_cache._put(embedding_cache._key(text), vec.copy())
+        queries.append((user_id, text, vec))
+    return queries
+
+
+def brute_force(ids: list, matrix: np.ndarray, query: np.ndarray, k: int) -> set:
+    scores = matrix @ query
+    return {str(ids[i]) for i in np.argsort(-scores)[:k]}
+
+
+async def replay(fn, queries: list) -> tuple:
+    """Sequential pass for latency, then a concurrent pass for throughput."""
+    latencies, outputs = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for q in queries:
+            t0 = time.perf_counter()
+            outputs.append(await fn(q))
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        sem = asyncio.Semaphore(CONCURRENCY)
+
+        async def bounded(q):
+            async with sem:
+                return await fn(q)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[bounded(q) for q in queries])
+        qps = len(queries) / (time.perf_counter() - t0)
+    return latencies, outputs, qps
+
+
+# ============================
+# SUITES
+# ============================
+
+async def retrieval_suite(queries, chunks_by_user, retrieve_similar):
+    async def run(q):
+        user_id, text, _ = q
+        results, _ = await retrieve_similar(text, [user_id], top_k=TOP_K)
+        return results
+
+    latencies, outputs, qps = await replay(run, queries)
+    recalls = []
+    for (user_id, _, vec), results in zip(queries, outputs):
+        ids, matrix = chunks_by_user[user_id]
+        truth = brute_force(ids, matrix, vec, TOP_K)
+        recalls.append(len(truth & {r["source_id"] for r in results}) / len(truth))
+    _report("retrieve_similar", latencies, recalls, qps)
+
+
+async def memory_suite(queries, convs_by_user, retrieve_from_conversation_memory):
+    async def run(q):
+        user_id, text, _ = q
+        return await retrieve_from_conversation_memory(user_id, text, top_k=TOP_K, domain="general")
+
+    latencies, outputs, qps = await replay(run, queries)
+    recalls = []
+    for (user_id, _, vec), results in zip(queries, outputs):
+        ids, matrix = convs_by_user[user_id]
+        truth = brute_force(ids, matrix, vec, TOP_K)
+        recalls.append(len(truth & {r["conversation_id"] for r in results}) / len(truth))
+    _report("conversation_memory", latencies, recalls, qps)
+
+
+def quantization_suite(corpus: SyntheticCorpus, KnowledgeBaseCache, recall_at_k):
+    """Recall and latency of the none / int8 / binary KB indexes on one large KB."""
+    from bson import ObjectId
+
+    n = N_USERS * DOCS_PER_USER * CHUNKS_PER_DOC
+    labels = corpus.rng.integers(0, N_CLUSTERS, size=n)
+    vectors = _unit(corpus.centers[labels] + 0.6 * corpus.rng.normal(size=(n, corpus.dim))).astype(np.float32)
+    queries = [corpus.vectors(int(c), 1)[0] for c in corpus.rng.integers(0, N_CLUSTERS, size=N_QUERIES)]
+    docs = [{"_id": ObjectId(), "chunk_text": f"chunk {i}", "embedding": vectors[i]} for i in range(n)]
+
+    exact = [np.argsort(-(vectors @ q))[:TOP_K] for q in queries]
+    for quantization in ["none", "int8", "binary"]:
+        kb = KnowledgeBaseCache("bench", "kb_bench", quantization=quantization)
+        kb._append(docs)  # no MongoDB behind this KB: build it directly
+        recalls, latencies = [], []
+        for q, truth in zip(queries, exact):
+            t0 = time.perf_counter()
+            hits = kb.search(q, TOP_K)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            recalls.append(recall_at_k([kb.rows_for([h["_id"]])[0] for h in hits], truth))
+        qps = len(queries) / (sum(latencies) / 1000)
+        _report(f"kb index ({quantization})", latencies, recalls, qps)
+
+
+# ============================
+# RUN
+# ============================
+
+async def main():
+    # App modules start background tasks on import, so import inside the loop
+    import app.config.db as app_db
+    from app.core.retriever_cache import knowledge_bases, embedding_cache, EMBEDDING_DIM, KnowledgeBaseCache
+    from app.core.retriever import retrieve_similar
+    from app.core.conversation_memory import retrieve_from_conversation_memory
+    from app.core.embedding_codec import encode_embedding
+    from app.core.embeddings import centroid_embedding
+    from app.core.quantization import recall_at_k
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+        client, backend = AsyncMongoMockClient(), "mongomock-motor"
+    except ImportError:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client, backend = AsyncIOMotorClient(BENCH_MONGO_URI), BENCH_MONGO_URI
+    bench_db = client[BENCH_DB]
+    await client.drop_database(BENCH_DB)
+
+    # Point every get_collection() and KB cache at the stand-in
+    app_db.db = bench_db
+    for name, kb in knowledge_bases.items():
+        kb.collection = bench_db[f"kb_{name}"]
+
+    print("\n============================")
+    print("🏁 RETRIEVAL BENCHMARK")
+    print("============================\n")
+    print(f"   → backend: {backend}")
+    print(f"   → {N_USERS} users × {DOCS_PER_USER} docs × {CHUNKS_PER_DOC} chunks, "
+          f"{CONVERSATIONS_PER_USER} conversations/user, {N_QUERIES} queries, dim {EMBEDDING_DIM}\n")
+
+    corpus = SyntheticCorpus(EMBEDDING_DIM)
+    t0 = time.perf_counter()
+    users, chunks_by_user, convs_by_user, clusters_by_user = await seed(
+        bench_db, corpus, encode_embedding, centroid_embedding
+    )
+    print(f"   → seeded in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    for kb in knowledge_bases.values():
+        await kb.load_data(force=True)
+    print(f"   → KB cold load {time.perf_counter() - t0:.2f}s "
+          f"({sum(kb.size for kb in knowledge_bases.values())} chunks)\n")
+
+    queries = make_queries(corpus, users, clusters_by_user, embedding_cache)
+    await retrieval_suite(queries, chunks_by_user, retrieve_similar)
+    await memory_suite(queries, convs_by_user, retrieve_from_conversation_memory)
+    if QUANTIZATION_SUITE:
+        quantization_suite(corpus, KnowledgeBaseCache, recall_at_k)
+
+    await client.drop_database(BENCH_DB)
+    print("\n============================")
+    print("✔ RETRIEVAL BENCHMARK COMPLETE")
+    print("============================\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())